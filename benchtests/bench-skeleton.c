@@ -16,10 +16,13 @@
    License along with the GNU C Library; if not, see
    <http://www.gnu.org/licenses/>.  */
 
+#include <pthread.h>
+#include <sched.h>
 #include <string.h>
 #include <stdint.h>
 #include <stdbool.h>
 #include <stdio.h>
+#include <stdlib.h>
 #include <time.h>
 #include <inttypes.h>
 #include "bench-timing.h"
@@ -28,10 +31,356 @@
 
 #include "bench-util.c"
 
+#ifdef __has_include
+# if __has_include (<linux/perf_event.h>)
+#  include <linux/perf_event.h>
+#  include <sys/ioctl.h>
+#  include <sys/syscall.h>
+#  include <unistd.h>
+#  define BENCH_COUNTERS 1
+# endif
+#endif
+
 #define TIMESPEC_AFTER(a, b) \
   (((a).tv_sec == (b).tv_sec) ?						      \
      ((a).tv_nsec > (b).tv_nsec) :					      \
 	((a).tv_sec > (b).tv_sec))
+
+/* Write the N least significant bytes of V to FP in little-endian order.  */
+static void
+write_le (FILE *fp, uint64_t v, int n)
+{
+  for (int i = 0; i < n; i++)
+    putc ((v >> (8 * i)) & 0xff, fp);
+}
+
+static int
+compare_doubles (const void *a, const void *b)
+{
+  double da = *(const double *) a;
+  double db = *(const double *) b;
+
+  return (da > db) - (da < db);
+}
+
+/* Append a record with the detailed timings of variant V to the binary
+   timings file FP, in ascending order.  See
+   benchtests/scripts/import_bench.py for the format.  */
+static void
+write_timings (FILE *fp, int v)
+{
+  size_t flen = strlen (FUNCNAME);
+  size_t vlen = strlen (VARIANT (v));
+  double *sorted = malloc (NUM_SAMPLES (v) * sizeof (double));
+
+  if (sorted == NULL)
+    {
+      perror ("malloc");
+      exit (1);
+    }
+  for (int i = 0; i < NUM_SAMPLES (v); i++)
+    sorted[i] = RESULT (v, i);
+  qsort (sorted, NUM_SAMPLES (v), sizeof (double), compare_doubles);
+
+  fwrite ("BTIM", 1, 4, fp);
+  write_le (fp, flen, 2);
+  write_le (fp, vlen, 2);
+  write_le (fp, NUM_SAMPLES (v), 8);
+  fwrite (FUNCNAME, 1, flen, fp);
+  fwrite (VARIANT (v), 1, vlen, fp);
+  write_le (fp, 0, (8 - (flen + vlen) % 8) % 8);
+
+  for (int i = 0; i < NUM_SAMPLES (v); i++)
+    {
+      uint64_t u;
+      memcpy (&u, &sorted[i], sizeof (u));
+      write_le (fp, u, 8);
+    }
+  free (sorted);
+}
+
+/* Log-bucketed histogram of the time per call of a variant.  Each power of
+   two is split into 2^HIST_PRECISION linear sub-buckets, so that a bucket
+   spans at most 2^-HIST_PRECISION of its lower bound.  Times outside of
+   [2^HIST_MIN_EXP, 2^HIST_MAX_EXP) go into the first or last bucket.  See
+   benchtests/scripts/import_bench.py for how to read the histogram.
+
+   Each measurement is the mean time of the iterations of a single input,
+   since timing individual calls would cost more than many of the calls
+   themselves.  Workload variants are only timed over rounds of all of
+   their inputs, whose means say nothing about the distribution of the
+   time per call, so they have no histogram.  */
+#define HIST_PRECISION 4
+#define HIST_MIN_EXP (-16)
+#define HIST_MAX_EXP 48
+#define HIST_BUCKETS ((HIST_MAX_EXP - HIST_MIN_EXP) << HIST_PRECISION)
+
+static uint64_t hist[HIST_BUCKETS];
+
+/* Count the time per call T in the histogram.  */
+static void
+hist_record (double t)
+{
+  uint64_t u;
+  memcpy (&u, &t, sizeof (u));
+  int e = (int) ((u >> 52) & 0x7ff) - 1023;
+  int i;
+
+  if (!(t > 0) || e < HIST_MIN_EXP)
+    i = 0;
+  else if (e >= HIST_MAX_EXP)
+    i = HIST_BUCKETS - 1;
+  else
+    i = (((e - HIST_MIN_EXP) << HIST_PRECISION)
+	 | ((u >> (52 - HIST_PRECISION)) & ((1 << HIST_PRECISION) - 1)));
+  hist[i]++;
+}
+
+/* Print the non-empty buckets of the histogram and clear it.  */
+static void
+hist_print (json_ctx_t *ctx)
+{
+  json_attr_object_begin (ctx, "histogram");
+  json_attr_int (ctx, "precision", HIST_PRECISION);
+  json_attr_int (ctx, "min-exp", HIST_MIN_EXP);
+
+  json_array_begin (ctx, "buckets");
+  for (int i = 0; i < HIST_BUCKETS; i++)
+    if (hist[i] != 0)
+      json_element_int (ctx, i);
+  json_array_end (ctx);
+
+  json_array_begin (ctx, "counts");
+  for (int i = 0; i < HIST_BUCKETS; i++)
+    if (hist[i] != 0)
+      json_element_uint (ctx, hist[i]);
+  json_array_end (ctx);
+
+  json_attr_object_end (ctx);
+  memset (hist, 0, sizeof (hist));
+}
+
+#ifdef BENCH_COUNTERS
+/* Hardware events counted for each variant with -c.  */
+static const struct
+{
+  const char *name;
+  uint64_t config;
+} counter_events[] =
+  {
+    { "instructions", PERF_COUNT_HW_INSTRUCTIONS },
+    { "branch-misses", PERF_COUNT_HW_BRANCH_MISSES },
+    { "cache-misses", PERF_COUNT_HW_CACHE_MISSES },
+  };
+
+# define NUM_COUNTERS (sizeof (counter_events) / sizeof (counter_events[0]))
+
+/* File descriptors of the counters, -1 for events that cannot be counted.
+   The first counter that could be opened leads the group of counters.  */
+static int counter_fd[NUM_COUNTERS];
+static int counter_leader = -1;
+static double counter_value[NUM_COUNTERS];
+
+/* Open the counters of this thread.  Return false if none of the events
+   can be counted, for example because the kernel does not allow it.  */
+static bool
+counters_open (void)
+{
+  for (size_t i = 0; i < NUM_COUNTERS; i++)
+    {
+      struct perf_event_attr attr;
+      memset (&attr, 0, sizeof (attr));
+      attr.type = PERF_TYPE_HARDWARE;
+      attr.size = sizeof (attr);
+      attr.config = counter_events[i].config;
+      attr.disabled = counter_leader < 0;
+      attr.exclude_kernel = 1;
+      attr.exclude_hv = 1;
+      attr.read_format = (PERF_FORMAT_TOTAL_TIME_ENABLED
+			  | PERF_FORMAT_TOTAL_TIME_RUNNING);
+      counter_fd[i] = syscall (__NR_perf_event_open, &attr, 0, -1,
+			       counter_leader, 0);
+      if (counter_fd[i] >= 0 && counter_leader < 0)
+	counter_leader = counter_fd[i];
+    }
+  return counter_leader >= 0;
+}
+
+static void
+counters_start (void)
+{
+  ioctl (counter_leader, PERF_EVENT_IOC_RESET, PERF_IOC_FLAG_GROUP);
+  ioctl (counter_leader, PERF_EVENT_IOC_ENABLE, PERF_IOC_FLAG_GROUP);
+}
+
+/* Stop the counters and read their values, scaled up if the kernel had
+   to multiplex them.  Values that cannot be read are negative.  */
+static void
+counters_stop (void)
+{
+  ioctl (counter_leader, PERF_EVENT_IOC_DISABLE, PERF_IOC_FLAG_GROUP);
+  for (size_t i = 0; i < NUM_COUNTERS; i++)
+    {
+      uint64_t val[3];
+      counter_value[i] = -1;
+      if (counter_fd[i] >= 0
+	  && read (counter_fd[i], val, sizeof (val)) == sizeof (val)
+	  && val[2] != 0)
+	counter_value[i] = (double) val[0] * val[1] / val[2];
+    }
+}
+
+/* Print the counters per call for CALLS calls.  */
+static void
+counters_print (json_ctx_t *ctx, double calls)
+{
+  json_attr_object_begin (ctx, "counters");
+  for (size_t i = 0; i < NUM_COUNTERS; i++)
+    if (counter_value[i] >= 0)
+      json_attr_double (ctx, counter_events[i].name,
+			counter_value[i] / calls);
+  json_attr_object_end (ctx);
+}
+#else
+static bool
+counters_open (void)
+{
+  return false;
+}
+
+static void
+counters_start (void)
+{
+}
+
+static void
+counters_stop (void)
+{
+}
+
+static void
+counters_print (json_ctx_t *ctx, double calls)
+{
+}
+#endif
+
+/* State of a thread running a variant in the thread scaling mode.  */
+struct bench_thread
+{
+  pthread_t thread;
+  int v;
+  unsigned long iters;
+  /* Wall-clock time in nanoseconds and number of calls.  */
+  double time;
+  double calls;
+};
+
+static pthread_barrier_t bench_barrier;
+
+static double
+timespec_ns (const struct timespec *ts)
+{
+  return ts->tv_sec * 1000000000.0 + ts->tv_nsec;
+}
+
+/* Call the function with all inputs of a variant in a loop for about
+   DURATION seconds, like a workload variant.  */
+static void *
+bench_thread (void *arg)
+{
+  struct bench_thread *t = arg;
+  int v = t->v;
+  struct timespec runtime, start, end;
+  unsigned long i, k;
+  BENCH_VARS;
+
+  /* Start all threads at the same time so that they run concurrently.  */
+  pthread_barrier_wait (&bench_barrier);
+
+  clock_gettime (CLOCK_MONOTONIC_RAW, &runtime);
+  runtime.tv_sec += DURATION;
+  t->time = 0;
+  t->calls = 0;
+  do
+    {
+      clock_gettime (CLOCK_MONOTONIC_RAW, &start);
+      for (k = 0; k < t->iters; k++)
+	for (i = 0; i < NUM_SAMPLES (v); i++)
+	  BENCH_FUNC (v, i);
+      clock_gettime (CLOCK_MONOTONIC_RAW, &end);
+      t->time += timespec_ns (&end) - timespec_ns (&start);
+      t->calls += (double) t->iters * NUM_SAMPLES (v);
+    }
+  while (TIMESPEC_AFTER (runtime, end));
+
+  return NULL;
+}
+
+/* Run variant V on NTHREADS threads, pinned to distinct CPUs as far as the
+   affinity mask of the process allows, and print the aggregate and per
+   thread throughput in calls per second.  The durations are the wall-clock
+   time of the threads in nanoseconds.  */
+static void
+bench_threads (json_ctx_t *ctx, int v, int nthreads, unsigned long iters)
+{
+  struct bench_thread threads[nthreads];
+  cpu_set_t cpus;
+  int cpu = -1;
+
+  if (sched_getaffinity (0, sizeof (cpus), &cpus) != 0)
+    CPU_ZERO (&cpus);
+  pthread_barrier_init (&bench_barrier, NULL, nthreads);
+
+  for (int t = 0; t < nthreads; t++)
+    {
+      pthread_attr_t attr;
+      pthread_attr_init (&attr);
+      if (CPU_COUNT (&cpus) > 0)
+	{
+	  cpu_set_t set;
+	  do
+	    cpu = (cpu + 1) % CPU_SETSIZE;
+	  while (!CPU_ISSET (cpu, &cpus));
+	  CPU_ZERO (&set);
+	  CPU_SET (cpu, &set);
+	  pthread_attr_setaffinity_np (&attr, sizeof (set), &set);
+	}
+
+      threads[t].v = v;
+      threads[t].iters = iters;
+      int err = pthread_create (&threads[t].thread, &attr, bench_thread,
+				&threads[t]);
+      if (err != 0)
+	{
+	  fprintf (stderr, "pthread_create: %s\n", strerror (err));
+	  exit (1);
+	}
+      pthread_attr_destroy (&attr);
+    }
+
+  double time = 0, calls = 0, throughput = 0;
+  for (int t = 0; t < nthreads; t++)
+    {
+      pthread_join (threads[t].thread, NULL);
+      time += threads[t].time;
+      calls += threads[t].calls;
+      throughput += threads[t].calls / threads[t].time * 1000000000.0;
+    }
+  pthread_barrier_destroy (&bench_barrier);
+
+  json_attr_int (ctx, "threads", nthreads);
+  json_attr_double (ctx, "duration", time);
+  json_attr_double (ctx, "iterations", calls);
+  json_attr_double (ctx, "throughput", throughput);
+  json_attr_double (ctx, "reciprocal-throughput", time / calls);
+
+  json_array_begin (ctx, "thread-throughput");
+  for (int t = 0; t < nthreads; t++)
+    json_element_double (ctx, threads[t].calls / threads[t].time
+			 * 1000000000.0);
+  json_array_end (ctx);
+}
+
 int
 main (int argc, char **argv)
 {
@@ -39,10 +388,60 @@ main (int argc, char **argv)
   struct timespec runtime;
   timing_t start, end;
   bool detailed = false;
+  bool counters = false;
+  int nthreads = 0;
+  FILE *timings_fp = NULL;
+#ifdef BENCH_LOAD_ARGS
+  const char *args_file = NULL;
+#endif
   json_ctx_t json_ctx;
 
-  if (argc == 2 && !strcmp (argv[1], "-d"))
-    detailed = true;
+  /* -d prints detailed timings into the JSON output, -T FILE appends them
+     to the binary timings file FILE instead.  -t N runs every variant on N
+     threads to measure how the function scales.  -c records hardware
+     counters for each variant if the system supports it.  -a FILE reads
+     the arguments from the binary argument file FILE instead of the one
+     in the build directory.  */
+  for (int a = 1; a < argc; a++)
+    if (!strcmp (argv[a], "-d"))
+      detailed = true;
+    else if (!strcmp (argv[a], "-c"))
+      counters = true;
+    else if (!strcmp (argv[a], "-t") && a + 1 < argc)
+      nthreads = atoi (argv[++a]);
+#ifdef BENCH_LOAD_ARGS
+    else if (!strcmp (argv[a], "-a") && a + 1 < argc)
+      args_file = argv[++a];
+#endif
+    else if (!strcmp (argv[a], "-T") && a + 1 < argc)
+      {
+	timings_fp = fopen (argv[++a], "ab");
+	if (timings_fp == NULL)
+	  {
+	    perror (argv[a]);
+	    return 1;
+	  }
+      }
+
+#ifdef BENCH_LOAD_ARGS
+  BENCH_LOAD_ARGS (args_file);
+#endif
+
+#ifndef BENCH_THREADS
+  /* The threads would share the variables the results are stored in.  */
+  if (nthreads > 0)
+    {
+      fprintf (stderr, "Running on several threads needs a build with "
+	       "BENCH_THREADS\n");
+      return 1;
+    }
+#endif
+
+  if (counters && !counters_open ())
+    {
+      fprintf (stderr, "Hardware counters are not available\n");
+      counters = false;
+    }
 
   bench_start ();
 
@@ -64,6 +463,14 @@ main (int argc, char **argv)
 
   for (int v = 0; v < NUM_VARIANTS; v++)
     {
+      if (nthreads > 0)
+	{
+	  json_attr_object_begin (&json_ctx, VARIANT (v));
+	  bench_threads (&json_ctx, v, nthreads, iters);
+	  json_attr_object_end (&json_ctx);
+	  continue;
+	}
+
       /* Run for approximately DURATION seconds.  */
       clock_gettime (CLOCK_MONOTONIC_RAW, &runtime);
       runtime.tv_sec += DURATION;
@@ -75,6 +482,8 @@ main (int argc, char **argv)
       int64_t c = 0;
       uint64_t cur;
       BENCH_VARS;
+      if (counters)
+	counters_start ();
       while (1)
 	{
 	  if (is_bench)
@@ -117,6 +526,7 @@ main (int argc, char **argv)
 		  min = cur;
 
 		TIMING_ACCUM (total, cur);
+		hist_record ((double) cur / iters);
 		/* Accumulate timings for the value.  In the end we will divide
 		   by the total iterations.  */
 		RESULT_ACCUM (cur, v, i, c * iters, (c + 1) * iters);
@@ -136,6 +546,8 @@ main (int argc, char **argv)
       double d_iters;
 
     done:
+      if (counters)
+	counters_stop ();
       d_total_s = total;
       d_iters = iters;
 
@@ -163,7 +575,15 @@ main (int argc, char **argv)
 	  json_attr_double (&json_ctx, "mean", d_total_s / d_total_i);
 	}
 
-      if (detailed && !is_bench)
+      if (!is_bench)
+	hist_print (&json_ctx);
+
+      if (counters)
+	counters_print (&json_ctx, is_bench ? 2 * d_total_i : d_total_i);
+
+      if (timings_fp != NULL && !is_bench)
+	write_timings (timings_fp, v);
+      else if (detailed && !is_bench)
 	{
 	  json_array_begin (&json_ctx, "timings");
 
@@ -180,5 +600,11 @@ main (int argc, char **argv)
   /* End function.  */
   json_attr_object_end (&json_ctx);
 
+  if (timings_fp != NULL && fclose (timings_fp) != 0)
+    {
+      perror ("fclose");
+      return 1;
+    }
+
   return 0;
 }
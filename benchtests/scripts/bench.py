@@ -22,12 +22,35 @@ This script takes a function name as input and generates a program using
 an input file located in the benchtests directory.  The name of the
 input file should be of the form foo-inputs where 'foo' is the name of
 the function.
+
+The program is printed to standard output, or written to the file given
+with -o.  In the latter case the first line of the program records a hash
+of everything it was generated from and the file is left untouched,
+modification time included, if the hash has not changed.
+
+With the directive '## storage: binary' in the input file, the argument
+values are not written into the program as initializers but into a binary
+argument file next to it, which the program maps and unpacks at startup.
+This keeps the program small and its compile time constant for workloads
+with millions of inputs.  The argument file of bench-foo.c is
+bench-foo.args.  The program bench-foo reads it from the directory given
+by the macro BENCH_ARGS_DIR when it is compiled, or from the file given
+with its -a option.  The file starts with the 4 bytes 'BARG' and the 40 byte
+hash of the inputs, padded to ARGS_HEADER_SIZE bytes.  The arguments of
+the samples of all variants follow in order, each argument stored in
+little-endian byte order as a 4 or 8 byte float if it has type float or
+double, and as an 8 byte integer if it has an integer type.
 """
 
 from __future__ import print_function
+import argparse
+import hashlib
 import sys
 import os
 import itertools
+import random
+import struct
+import input_gen
 
 # Macro definitions for functions that take no arguments.  For functions
 # that take arguments, the STRUCT_TEMPLATE, ARGS_TEMPLATE and
@@ -79,6 +102,16 @@ struct _variants variants[%(num_variants)d] = {
 #define VARIANT(i) (variants[i].name)
 '''
 
+# Storage class of the variables the results of the calls are stored in.
+# They are only thread local in programs built to run on several threads,
+# so that the threads do not share a cache line.
+SINK_TEMPLATE = '''
+#ifdef BENCH_THREADS
+# define BENCH_SINK __thread
+#else
+# define BENCH_SINK
+#endif'''
+
 # Epilogue for the generated source file.
 EPILOGUE = '''
 #define RESULT(__v, __i) (variants[(__v)].in[(__i)].timing)
@@ -91,6 +124,152 @@ EPILOGUE = '''
 #include "bench-skeleton.c"'''
 
 
+# First line of a generated program written to a file.
+HASH_LINE = '/* Generated by bench.py from input hash %s.  */\n'
+
+# Second line of a generated program that reads its arguments from a
+# binary argument file.
+ARGS_HASH_LINE = '#define BENCH_ARGS_HASH "%s"\n'
+
+# Definition of the name of the binary argument file that follows it.
+ARGS_NAME_LINE = '#define BENCH_ARGS_NAME "%s"\n'
+
+# Magic number and size of the header of binary argument files.
+ARGS_MAGIC = b'BARG'
+ARGS_HEADER_SIZE = 48
+
+# Floating point types that can be stored in binary argument files, with
+# the struct module format and the name of the function of the generated
+# program that reads an argument of the type.  Integer arguments are
+# stored in 8 bytes.
+FLOAT_TYPES = {
+    'double': ('<d', 'args_double'),
+    'float': ('<f', 'args_float'),
+}
+
+SIGNED_TYPES = ['char', 'signed char', 'short', 'int', 'long', 'long long',
+                'ssize_t', 'int8_t', 'int16_t', 'int32_t', 'int64_t',
+                'intptr_t', 'intmax_t']
+
+UNSIGNED_TYPES = ['unsigned char', 'unsigned short', 'unsigned int',
+                  'unsigned', 'unsigned long', 'unsigned long long',
+                  'size_t', 'uint8_t', 'uint16_t', 'uint32_t', 'uint64_t',
+                  'uintptr_t', 'uintmax_t']
+
+# Definitions to read the arguments of all variants from a binary argument
+# file at startup.
+LOAD_ARGS_INCLUDES = '''
+#include <fcntl.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+'''
+
+LOAD_ARGS_TEMPLATE = '''
+#define ARGS_HEADER_SIZE %(header_size)d
+#define ARGS_RECORD_SIZE %(record_size)d
+
+static inline uint64_t
+args_le (const unsigned char **p, int n)
+{
+  uint64_t v = 0;
+  for (int b = n - 1; b >= 0; b--)
+    v = (v << 8) | (*p)[b];
+  *p += n;
+  return v;
+}
+
+static inline uint64_t
+args_u64 (const unsigned char **p)
+{
+  return args_le (p, 8);
+}
+
+static inline int64_t
+args_s64 (const unsigned char **p)
+{
+  return (int64_t) args_le (p, 8);
+}
+
+static inline double
+args_double (const unsigned char **p)
+{
+  uint64_t u = args_le (p, 8);
+  double d;
+  memcpy (&d, &u, sizeof (d));
+  return d;
+}
+
+static inline float
+args_float (const unsigned char **p)
+{
+  uint32_t u = args_le (p, 4);
+  float f;
+  memcpy (&f, &u, sizeof (f));
+  return f;
+}
+
+#ifndef BENCH_ARGS_DIR
+# define BENCH_ARGS_DIR ""
+#endif
+
+/* Read the arguments of all variants from the binary argument file NAME,
+   or BENCH_ARGS_NAME in BENCH_ARGS_DIR if NAME is NULL.  See
+   benchtests/scripts/bench.py for the format.  */
+static void
+bench_load_args (const char *name)
+{
+  if (name == NULL)
+    name = BENCH_ARGS_DIR BENCH_ARGS_NAME;
+
+  struct stat st;
+  int fd = open (name, O_RDONLY);
+  if (fd < 0 || fstat (fd, &st) != 0)
+    {
+      perror (name);
+      exit (1);
+    }
+
+  size_t size = ARGS_HEADER_SIZE;
+  for (int v = 0; v < NUM_VARIANTS; v++)
+    size += (size_t) variants[v].count * ARGS_RECORD_SIZE;
+
+  const unsigned char *map = mmap (NULL, size, PROT_READ, MAP_PRIVATE, fd, 0);
+  if (st.st_size != size || map == MAP_FAILED
+      || memcmp (map, "%(magic)s" BENCH_ARGS_HASH, %(magic_len)d + 40) != 0)
+    {
+      fprintf (stderr, "%%s: not the argument file of this program\\n", name);
+      exit (1);
+    }
+
+  const unsigned char *p = map + ARGS_HEADER_SIZE;
+  for (int v = 0; v < NUM_VARIANTS; v++)
+    {
+      struct args *in = calloc (variants[v].count, sizeof (struct args));
+      if (in == NULL)
+	{
+	  perror ("calloc");
+	  exit (1);
+	}
+      for (int i = 0; i < variants[v].count; i++)
+	{
+%(unpack)s
+	}
+      variants[v].in = in;
+    }
+
+  munmap ((void *) map, size);
+  close (fd);
+}
+
+#define BENCH_LOAD_ARGS bench_load_args
+'''
+
+
 def gen_source(func, directives, all_vals):
     """Generate source for the function
 
@@ -101,25 +280,30 @@ def gen_source(func, directives, all_vals):
       func: The function name
       directives: A dictionary of directives applicable to this function
       all_vals: A dictionary input values
+
+    Returns:
+      The C source.
     """
+    out = []
+
     # The includes go in first.
     for header in directives['includes']:
-        print('#include <%s>' % header)
+        out.append('#include <%s>' % header)
 
     for header in directives['include-sources']:
-        print('#include "%s"' % header)
+        out.append('#include "%s"' % header)
 
     # Print macros.  This branches out to a separate routine if
     # the function takes arguments.
     if not directives['args']:
-        print(DEFINES_TEMPLATE % {'func': func})
+        out.append(DEFINES_TEMPLATE % {'func': func})
         outargs = []
     else:
-        outargs = _print_arg_data(func, directives, all_vals)
+        outargs = _print_arg_data(func, directives, all_vals, out)
 
     # Print the output variable definitions if necessary.
-    for out in outargs:
-        print(out)
+    out.append(SINK_TEMPLATE)
+    out.extend(outargs)
 
     # If we have a return value from the function, make sure it is
     # assigned to prevent the compiler from optimizing out the
@@ -129,8 +313,9 @@ def gen_source(func, directives, all_vals):
     defvar = ''
 
     if directives['ret']:
-        print('static %s volatile ret;' % directives['ret'])
-        print('static %s zero __attribute__((used)) = 0;' % directives['ret'])
+        out.append('static BENCH_SINK %s volatile ret;' % directives['ret'])
+        out.append('static %s zero __attribute__((used)) = 0;'
+                   % directives['ret'])
         getret = 'ret = func_res = '
         # Note this may not work if argument and result type are incompatible.
         latarg = 'func_res * zero +'
@@ -138,12 +323,14 @@ def gen_source(func, directives, all_vals):
 
     # Test initialization.
     if directives['init']:
-        print('#define BENCH_INIT %s' % directives['init'])
+        out.append('#define BENCH_INIT %s' % directives['init'])
 
-    print(EPILOGUE % {'getret': getret, 'func': func, 'latarg': latarg, 'defvar': defvar })
+    out.append(EPILOGUE % {'getret': getret, 'func': func, 'latarg': latarg, 'defvar': defvar })
+    out.append('')
+    return '\n'.join(out)
 
 
-def _print_arg_data(func, directives, all_vals):
+def _print_arg_data(func, directives, all_vals, out):
     """Print argument data
 
     This is a helper function for gen_source that prints structure and
@@ -154,6 +341,7 @@ def _print_arg_data(func, directives, all_vals):
       func: Function name
       directives: A dictionary of directives applicable to this function
       all_vals: A dictionary input values
+      out: The list of lines of source to append to
 
     Returns:
       Returns a list of definitions for function arguments that act as
@@ -172,32 +360,162 @@ def _print_arg_data(func, directives, all_vals):
             if pos == -1:
                 die('Output argument must be a pointer type')
 
-            outargs.append('static %s out%d __attribute__((used));' % (arg[1:pos], i))
+            outargs.append('static BENCH_SINK %s out%d __attribute__((used));' % (arg[1:pos], i))
             func_args.append(' &out%d' % i)
         else:
             arg_struct.append('  %s volatile arg%d;' % (arg, i))
             func_args.append('variants[v].in[i].arg%d' % i)
 
-    print(STRUCT_TEMPLATE % {'args' : '\n'.join(arg_struct), 'func': func,
-                             'func_args': ', '.join(func_args)})
+    out.append(STRUCT_TEMPLATE % {'args' : '\n'.join(arg_struct), 'func': func,
+                                  'func_args': ', '.join(func_args)})
+
+    if directives['storage'] == 'binary':
+        _print_load_args(directives, all_vals, out)
+        return outargs
 
     # Now print the values.
     variants = []
     for (k, vals), i in zip(all_vals.items(), itertools.count()):
-        out = ['  {%s, 0},' % v for v in vals]
+        vals_out = ['  {%s, 0},' % v for v in vals]
 
         # Members for the variants structure list that we will
         # print later.
         variants.append('  {"%s", %d, in%d},' % (k, len(vals), i))
-        print(ARGS_TEMPLATE % {'argnum': i, 'num_args': len(vals),
-                               'args': '\n'.join(out)})
+        out.append(ARGS_TEMPLATE % {'argnum': i, 'num_args': len(vals),
+                                    'args': '\n'.join(vals_out)})
 
     # Print the variants and the last set of macros.
-    print(VARIANTS_TEMPLATE % {'num_variants': len(all_vals),
-                               'variants': '\n'.join(variants)})
+    out.append(VARIANTS_TEMPLATE % {'num_variants': len(all_vals),
+                                    'variants': '\n'.join(variants)})
     return outargs
 
 
+def _print_load_args(directives, all_vals, out):
+    """Print the variants of a program with a binary argument file
+
+    This is a helper function for _print_arg_data that prints the variants
+    without arguments and the code to read the arguments from the binary
+    argument file at startup.
+
+    Args:
+      directives: A dictionary of directives applicable to this function
+      all_vals: A dictionary input values
+      out: The list of lines of source to append to
+    """
+    out.append(LOAD_ARGS_INCLUDES)
+
+    variants = ['  {"%s", %d, NULL},' % (k, len(vals))
+                for k, vals in all_vals.items()]
+    out.append(VARIANTS_TEMPLATE % {'num_variants': len(all_vals),
+                                    'variants': '\n'.join(variants)})
+
+    unpack = []
+    for arg, i in zip(directives['args'], itertools.count()):
+        if arg[0] == '<':
+            continue
+        unpack.append('\t  in[i].arg%d = %s (&p);'
+                      % (i, _binary_type(arg)[1]))
+
+    out.append(LOAD_ARGS_TEMPLATE % {
+        'header_size': ARGS_HEADER_SIZE,
+        'record_size': struct.calcsize(_record_format(directives)),
+        'magic': ARGS_MAGIC.decode('ascii'),
+        'magic_len': len(ARGS_MAGIC),
+        'unpack': '\n'.join(unpack)})
+
+
+def _binary_type(arg):
+    """Get the binary representation of an argument type
+
+    Args:
+      arg: The argument type
+
+    Returns:
+      A tuple of the struct module format of the type and the name of the
+      function of the generated program that reads an argument of the type.
+    """
+    typ = ' '.join(arg.replace('volatile', ' ').replace('const', ' ').split())
+    if typ in FLOAT_TYPES:
+        return FLOAT_TYPES[typ]
+    if typ in SIGNED_TYPES:
+        return '<q', 'args_s64'
+    if typ in UNSIGNED_TYPES:
+        return '<Q', 'args_u64'
+    die('Arguments of type %s cannot be stored in binary form' % arg)
+
+
+def _record_format(directives):
+    """Get the struct module format of the arguments of a sample
+
+    Args:
+      directives: A dictionary of directives applicable to this function
+
+    Returns:
+      The format string.
+    """
+    return '<' + ''.join(_binary_type(arg)[0][1:]
+                         for arg in directives['args'] if arg[0] != '<')
+
+
+def _parse_value(val, fmt):
+    """Parse the C literal of an argument
+
+    Args:
+      val: The literal
+      fmt: The struct module format of the argument type
+
+    Returns:
+      The value of the literal.
+    """
+    lit = val.strip()
+    try:
+        if fmt in ('<d', '<f'):
+            # Drop a float or long double suffix.
+            if lit[-1:] in 'fFlL' and (lit[-2:-1].isdigit()
+                                       or lit[-2:-1] == '.'):
+                lit = lit[:-1]
+            if 'x' in lit.lower():
+                return float.fromhex(lit)
+            return float(lit)
+        lit = lit.rstrip('uUlL')
+        digits = lit.lstrip('+-')
+        if len(digits) > 1 and digits[0] == '0' and digits[1].isdigit():
+            return int(lit, 8)
+        return int(lit, 0)
+    except ValueError:
+        die('Value %s cannot be stored in binary form' % val)
+
+
+def gen_args_file(directives, all_vals, hashval):
+    """Generate the binary argument file of a program
+
+    Args:
+      directives: A dictionary of directives applicable to this function
+      all_vals: A dictionary input values
+      hashval: The hash of the inputs of the program
+
+    Returns:
+      The contents of the argument file.
+    """
+    fmt = _record_format(directives)
+    types = [fmt[0] + c for c in fmt[1:]]
+    record = struct.Struct(fmt)
+
+    out = [(ARGS_MAGIC + hashval.encode('ascii')).ljust(ARGS_HEADER_SIZE,
+                                                        b'\0')]
+    for vals in all_vals.values():
+        for line in vals:
+            vals = line.split(',')
+            if len(vals) != len(types):
+                die('Expected %d arguments: %s' % (len(types), line))
+            try:
+                out.append(record.pack(*[_parse_value(v, t)
+                                         for v, t in zip(vals, types)]))
+            except (struct.error, OverflowError):
+                die('Value out of range: %s' % line)
+    return b''.join(out)
+
+
 def _process_directive(d_name, d_val):
     """Process a directive.
 
@@ -218,12 +536,49 @@ def _process_directive(d_name, d_val):
         d_val = d_val.split(',')
     elif d_name == 'args':
         d_val = d_val.split(':')
+    elif d_name == 'storage' and d_val not in ('source', 'binary'):
+        die('Invalid storage: %s' % d_val)
 
     # Return the values.
     return d_val
 
 
-def parse_file(func):
+def _process_generator(d_name, d_val, directives, all_vals, inputs, rng):
+    """Process a directive that generates inputs
+
+    Add the inputs generated by a generate or trace directive to the
+    current variant, or reseed the generator for a seed directive.  This
+    is a helper function for parse_file.
+
+    Args:
+      d_name: Name of the directive
+      d_val: The string value of the directive
+      directives: A dictionary of the directives so far
+      all_vals: A dictionary of the input values so far
+      inputs: Name of the input file
+      rng: The random.Random to generate inputs with
+    """
+    try:
+        if d_name == 'seed':
+            rng.seed(int(d_val, 0))
+            return
+        if d_name == 'trace':
+            vals = input_gen.read_trace(os.path.join(os.path.dirname(inputs),
+                                                     d_val))
+        else:
+            types = [' '.join(arg.replace('volatile', ' ')
+                              .replace('const', ' ').split())
+                     for arg in directives['args'] if arg[0] != '<']
+            vals = input_gen.generate(d_val, types, rng)
+    except ValueError as ex:
+        die('Invalid %s directive: %s' % (d_name, ex))
+    except IOError as ex:
+        die("Failed to open trace file (%s): %s" % (ex.filename, ex.strerror))
+
+    all_vals.setdefault(directives['name'], []).extend(vals)
+
+
+def parse_file(func, inputs=None):
     """Parse an input file
 
     Given a function name, open and parse an input file for the function
@@ -232,6 +587,7 @@ def parse_file(func):
 
     Args:
       func: The function name
+      inputs: Name of the input file, FUNC-inputs if None
 
     Returns:
       A tuple of two elements, one a dictionary of directives and the
@@ -245,11 +601,18 @@ def parse_file(func):
             'includes': [],
             'include-sources': [],
             'ret': '',
-            'init': ''
+            'init': '',
+            'storage': 'source'
     }
 
+    if inputs is None:
+        inputs = '%s-inputs' % func
+
+    # Generated inputs only depend on the seed directive.
+    rng = random.Random(0)
+
     try:
-        with open('%s-inputs' % func) as f:
+        with open(inputs) as f:
             for line in f:
                 # Look for directives and parse it if found.
                 if line.startswith('##'):
@@ -257,7 +620,12 @@ def parse_file(func):
                         d_name, d_val = line[2:].split(':', 1)
                         d_name = d_name.strip()
                         d_val = d_val.strip()
-                        directives[d_name] = _process_directive(d_name, d_val)
+                        if d_name in ('generate', 'trace', 'seed'):
+                            _process_generator(d_name, d_val, directives,
+                                               all_vals, inputs, rng)
+                        else:
+                            directives[d_name] = _process_directive(d_name,
+                                                                    d_val)
                     except (IndexError, KeyError):
                         die('Invalid directive: %s' % line[2:])
 
@@ -290,6 +658,246 @@ def die(msg):
     sys.exit(os.EX_DATAERR)
 
 
+def input_hash(func, inputs, includes):
+    """Compute the hash of everything a program is generated from
+
+    Args:
+      func: The function name
+      inputs: Name of the input file
+      includes: List of files to prepend to the program
+
+    Returns:
+      The hash as a hexadecimal string.
+    """
+    h = hashlib.sha1()
+    scripts = []
+    for script in [__file__, input_gen.__file__]:
+        script = os.path.realpath(script)
+        if script.endswith('.pyc'):
+            script = script[:-1]
+        scripts.append(script)
+    for name in scripts + [inputs] + trace_files(inputs) + includes:
+        try:
+            with open(name, 'rb') as f:
+                data = f.read()
+        except IOError as ex:
+            die("Failed to open input file (%s): %s" % (ex.filename,
+                                                         ex.strerror))
+        h.update(('%s\0%d\0' % (os.path.basename(name),
+                                 len(data))).encode('utf-8'))
+        h.update(data)
+    h.update(func.encode('utf-8'))
+    return h.hexdigest()
+
+
+def trace_files(inputs):
+    """Get the trace files an input file refers to
+
+    Args:
+      inputs: Name of the input file
+
+    Returns:
+      The list of names of the files in the trace directives of INPUTS.
+    """
+    traces = []
+    try:
+        with open(inputs) as f:
+            for line in f:
+                if line.startswith('##'):
+                    d_name, _, d_val = line[2:].partition(':')
+                    if d_name.strip() == 'trace':
+                        traces.append(os.path.join(os.path.dirname(inputs),
+                                                   d_val.strip()))
+    except IOError as ex:
+        die("Failed to open input file (%s): %s" % (ex.filename, ex.strerror))
+    return traces
+
+
+def args_file_name(output):
+    """Get the name of the binary argument file of a generated program
+
+    Args:
+      output: Name of the generated program
+
+    Returns:
+      OUTPUT with the .c suffix replaced by .args.
+    """
+    if output.endswith('.c'):
+        output = output[:-2]
+    return output + '.args'
+
+
+def is_current(output, hashval):
+    """Check whether a generated program is up to date
+
+    Args:
+      output: Name of the generated program
+      hashval: The hash of the inputs of the program
+
+    Returns:
+      True if OUTPUT exists and was generated from inputs with hash HASHVAL,
+      and so was its binary argument file if it has one.
+    """
+    try:
+        with open(output, 'r') as f:
+            if f.readline() != HASH_LINE % hashval:
+                return False
+            if f.readline() != ARGS_HASH_LINE % hashval:
+                return True
+        with open(args_file_name(output), 'rb') as f:
+            return f.read(len(ARGS_MAGIC) + len(hashval)) == (
+                    ARGS_MAGIC + hashval.encode('ascii'))
+    except IOError:
+        return False
+
+
+def _write_file(name, data, mode):
+    """Write a file
+
+    Write to a temporary file first so that an interrupted run does not
+    leave a partial file behind.
+
+    Args:
+      name: Name of the file
+      data: The contents of the file
+      mode: The mode to open the file with
+    """
+    with open(name + '-tmp', mode) as f:
+        f.write(data)
+    os.rename(name + '-tmp', name)
+
+
+def write_source(func, output, includes, inputs=None):
+    """Generate the program for a function
+
+    Args:
+      func: The function name
+      output: Name of the file to write the program to, or None to print
+      it to standard output.
+      includes: List of files to prepend to the program
+      inputs: Name of the input file, FUNC-inputs if None
+
+    Returns:
+      True if the program was written, False if it was up to date.
+    """
+    if inputs is None:
+        inputs = '%s-inputs' % func
+
+    if output is not None:
+        hashval = input_hash(func, inputs, includes)
+        if is_current(output, hashval):
+            return False
+        text = [HASH_LINE % hashval]
+    else:
+        text = []
+
+    directives, all_vals = parse_file(func, inputs)
+    if directives['storage'] == 'binary':
+        if output is None:
+            die('Binary argument storage needs an output file')
+        if not directives['args']:
+            die('Binary argument storage needs arguments')
+        # Write the argument file first, the program being up to date
+        # implies that its argument file is.
+        _write_file(args_file_name(output),
+                    gen_args_file(directives, all_vals, hashval), 'wb')
+        text.append(ARGS_HASH_LINE % hashval)
+        text.append(ARGS_NAME_LINE
+                    % os.path.basename(args_file_name(output)))
+
+    for name in includes:
+        with open(name, 'r') as f:
+            text.append(f.read())
+
+    text.append(gen_source(func, directives, all_vals))
+
+    if output is None:
+        sys.stdout.write(''.join(text))
+    else:
+        _write_file(output, ''.join(text), 'w')
+    return True
+
+
+def find_functions(input_dir):
+    """Find the functions that have an input file in a directory
+
+    Args:
+      input_dir: The directory to search
+
+    Returns:
+      The sorted list of function names.
+    """
+    funcs = []
+    for name in os.listdir(input_dir):
+        if (name.endswith('-inputs')
+            and os.path.isfile(os.path.join(input_dir, name))):
+            funcs.append(name[:-len('-inputs')])
+    return sorted(funcs)
+
+
+def generate(job):
+    """Generate the program for a function in batch mode
+
+    Errors are reported on the standard error stream and returned rather
+    than ending the process, so that a failure in one function does not
+    stop a pool of workers.
+
+    Args:
+      job: A tuple of the function name, the output file name, the list of
+      files to prepend to the program and the input file name
+
+    Returns:
+      A tuple of the function name and True if the program was written,
+      False if it was up to date or None on error.
+    """
+    func, output, includes, inputs = job
+    try:
+        return func, write_source(func, output, includes, inputs)
+    except SystemExit:
+        return func, None
+    except (IOError, OSError) as ex:
+        print('%s: %s' % (func, ex), file=sys.stderr)
+        return func, None
+
+
+def write_sources(jobs, nprocs):
+    """Generate the programs for several functions
+
+    Args:
+      jobs: List of jobs as taken by generate
+      nprocs: Number of processes to generate the programs in
+
+    Returns:
+      True if all programs were generated successfully.
+    """
+    if nprocs > 1 and len(jobs) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(nprocs, len(jobs)))
+        try:
+            results = pool.map(generate, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [generate(job) for job in jobs]
+
+    return all(res is not None for func, res in results)
+
+
+def write_trace_deps(name, jobs):
+    """Write the trace files of several functions as a make variable
+
+    Args:
+      name: Name of the file to write
+      jobs: List of jobs as taken by generate
+    """
+    traces = []
+    for func, output, includes, inputs in jobs:
+        traces.extend(trace_files(inputs))
+    _write_file(name, '# Generated by bench.py.\nbench-trace-files := %s\n'
+                % ' '.join(sorted(set(traces))), 'w')
+
+
 def main(args):
     """Main function
 
@@ -297,18 +905,69 @@ def main(args):
     input file to generate C source that calls the function repeatedly
     for the input.
 
+    With an output directory, generate the programs of all functions named
+    on the command line, or of all functions with an input file in the
+    input directory if none are named, writing the program of FUNC to
+    bench-FUNC.c in the output directory.  This avoids starting the
+    interpreter once for every function.
+
     Args:
       args: The command line arguments with the program name dropped
 
     Returns:
-      os.EX_USAGE on error and os.EX_OK on success.
+      os.EX_USAGE on usage error, os.EX_DATAERR if a program could not be
+      generated and os.EX_OK on success.
     """
-    if len(args) != 1:
-        print('Usage: %s <function>' % sys.argv[0])
-        return os.EX_USAGE
-
-    directives, all_vals = parse_file(args[0])
-    gen_source(args[0], directives, all_vals)
+    parser = argparse.ArgumentParser(description='Generate benchmark programs for functions.')
+    parser.add_argument('functions', nargs='*', metavar='function',
+                        help='Function name')
+    parser.add_argument('-o', '--output',
+                        help='Write the program to OUTPUT unless it is up to date')
+    parser.add_argument('-d', '--output-dir',
+                        help='Write the program of each function FUNC to OUTPUT_DIR/bench-FUNC.c unless it is up to date')
+    parser.add_argument('--input-dir', default='.',
+                        help='Directory with the input files (default: %(default)s)')
+    parser.add_argument('-i', '--include', action='append', default=[],
+                        help='File to prepend to the programs')
+    parser.add_argument('--include-for', action='append', default=[],
+                        metavar='FUNC=FILE',
+                        help='File to prepend to the program of FUNC')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of programs to generate in parallel (default: %(default)s)')
+    parser.add_argument('--trace-deps', metavar='FILE',
+                        help='Write the trace files the programs are generated from to FILE as the make variable bench-trace-files')
+    args = parser.parse_args(args)
+
+    if args.output_dir is None:
+        if args.trace_deps is not None:
+            parser.error('--trace-deps needs --output-dir')
+        if len(args.functions) != 1:
+            parser.error('exactly one function is needed without --output-dir')
+        func = args.functions[0]
+        write_source(func, args.output, args.include,
+                     os.path.join(args.input_dir, '%s-inputs' % func))
+        return os.EX_OK
+
+    if args.output is not None:
+        parser.error('--output and --output-dir are mutually exclusive')
+
+    includes = {}
+    for opt in args.include_for:
+        func, sep, name = opt.partition('=')
+        if not sep:
+            parser.error('invalid --include-for argument: %s' % opt)
+        includes.setdefault(func, []).append(name)
+
+    funcs = args.functions or find_functions(args.input_dir)
+    jobs = [(func, os.path.join(args.output_dir, 'bench-%s.c' % func),
+             args.include + includes.get(func, []),
+             os.path.join(args.input_dir, '%s-inputs' % func))
+            for func in funcs]
+
+    if not write_sources(jobs, args.jobs):
+        return os.EX_DATAERR
+    if args.trace_deps is not None:
+        write_trace_deps(args.trace_deps, jobs)
     return os.EX_OK
 
 
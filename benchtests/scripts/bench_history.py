@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Store of benchmark results across runs
+
+Import benchmark output files into an SQLite database, indexed by commit,
+machine, function and variant, and query the history of a function
+variant.  The database is created when it is first used.  For example:
+
+  $ bench_history.py import --commit 1a2b3c --machine box bench.out
+  $ bench_history.py query sincos --stat mean
+
+Only the aggregate statistics of each function variant are stored, not the
+detailed timings.
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import os
+import platform
+import sqlite3
+import sys
+import import_bench as bench
+import export_bench as export
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY,
+  commit_id TEXT,
+  machine TEXT,
+  time REAL NOT NULL,
+  timing_type TEXT,
+  source TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_commit ON runs (commit_id);
+CREATE INDEX IF NOT EXISTS runs_machine ON runs (machine, time);
+CREATE TABLE IF NOT EXISTS results (
+  run INTEGER NOT NULL REFERENCES runs (id),
+  function TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  stat TEXT NOT NULL,
+  value REAL
+);
+CREATE INDEX IF NOT EXISTS results_lookup
+  ON results (function, variant, stat, run);
+'''
+
+# Fields of the records returned by queries.
+FIELDS = ['time', 'commit', 'machine', 'function', 'variant', 'stat',
+          'value']
+
+
+def open_db(filename):
+    """Open the result store, creating it if necessary
+
+    Args:
+        filename: Name of the database file
+    Return:
+        The sqlite3 connection.
+    """
+    db = sqlite3.connect(filename)
+    db.executescript(SCHEMA)
+    return db
+
+
+def import_run(db, filename, schema, commit, machine, time):
+    """Import a benchmark output file
+
+    A run previously imported for the same commit, machine and time is
+    replaced.  The file is parsed incrementally since the detailed timings
+    are not stored.
+
+    Args:
+        db: The sqlite3 connection
+        filename: Name of the benchmark output file
+        schema: Name of the schema file
+        commit: The commit the benchmark was built from or None
+        machine: The machine the benchmark ran on
+        time: Time of the run in seconds since the epoch
+    Return:
+        The number of results imported.
+    """
+    data = bench.parse_bench(filename, schema, stream=True)
+    rows = []
+    for func, variants in data['functions'].items():
+        for var, stats in variants.items():
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)):
+                    rows.append((func, var, stat, value))
+
+    with db:
+        old = [r[0] for r in db.execute(
+                'SELECT id FROM runs WHERE commit_id IS ? AND machine = ? '
+                'AND time = ?', (commit, machine, time))]
+        for run in old:
+            db.execute('DELETE FROM results WHERE run = ?', (run,))
+            db.execute('DELETE FROM runs WHERE id = ?', (run,))
+
+        cur = db.execute('INSERT INTO runs (commit_id, machine, time, '
+                         'timing_type, source) VALUES (?, ?, ?, ?, ?)',
+                         (commit, machine, time, data.get('timing_type'),
+                          os.path.abspath(filename)))
+        run = cur.lastrowid
+        db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?)',
+                       [(run,) + r for r in rows])
+    return len(rows)
+
+
+def query(db, func, var=None, stat='mean', machine=None, commit=None):
+    """Get the history of a function or a function variant
+
+    Args:
+        db: The sqlite3 connection
+        func: The function name
+        var: The function variant name or None for all variants
+        stat: The statistic to get
+        machine: Only get results from this machine if not None
+        commit: Only get results for this commit if not None
+    Return:
+        A list of records with the keys in FIELDS, ordered by variant and
+        time.
+    """
+    sql = ('SELECT runs.time, runs.commit_id, runs.machine, '
+           'results.function, results.variant, results.stat, results.value '
+           'FROM results JOIN runs ON results.run = runs.id '
+           'WHERE results.function = ? AND results.stat = ?')
+    params = [func, stat]
+    if var is not None:
+        sql += ' AND results.variant = ?'
+        params.append(var)
+    if machine is not None:
+        sql += ' AND runs.machine = ?'
+        params.append(machine)
+    if commit is not None:
+        sql += ' AND runs.commit_id = ?'
+        params.append(commit)
+    sql += ' ORDER BY results.variant, runs.time'
+
+    return [dict(zip(FIELDS, row)) for row in db.execute(sql, params)]
+
+
+def format_time(time):
+    """Format a time in seconds since the epoch in ISO 8601 format"""
+    return datetime.datetime.utcfromtimestamp(time).strftime(
+            '%Y-%m-%dT%H:%M:%S')
+
+
+def do_import(args):
+    """Import benchmark output files
+
+    Args:
+        args: The parsed command line arguments
+    Return:
+        The exit code.
+    """
+    db = open_db(args.db)
+    for filename in args.files:
+        if args.time is not None:
+            time = args.time
+        else:
+            time = os.path.getmtime(filename)
+        try:
+            count = import_run(db, filename, args.schema, args.commit,
+                               args.machine, time)
+        except (IOError, ValueError, bench.validator.ValidationError) as e:
+            print('%s: %s' % (filename, e), file=sys.stderr)
+            return os.EX_DATAERR
+        print('Imported %d results from %s' % (count, filename))
+    return os.EX_OK
+
+
+def do_query(args):
+    """Print the history of a function or a function variant
+
+    Args:
+        args: The parsed command line arguments
+    Return:
+        The exit code.
+    """
+    db = open_db(args.db)
+    records = query(db, args.function, args.variant, args.stat, args.machine,
+                    args.commit)
+    for rec in records:
+        rec['time'] = format_time(rec['time'])
+
+    if args.format != 'text':
+        export.write_records(sys.stdout, args.format, records, FIELDS)
+    else:
+        sys.stdout.write(''.join(['%s %-12s %-16s %s(%s)[%s]: %g\n'
+                                  % (r['time'], r['commit'] or '-',
+                                     r['machine'],
+                                     r['function'], r['variant'], r['stat'],
+                                     r['value'])
+                                  for r in records]))
+    return os.EX_OK
+
+
+def main(args):
+    """Program Entry Point
+
+    Args:
+        args: The command line arguments to the program
+    Return:
+        The exit code.
+    """
+    parser = argparse.ArgumentParser(description='Store and query benchmark results across runs.')
+    parser.add_argument('--db', default='bench-history.db',
+                        help='SQLite database file (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='action')
+
+    imp = subparsers.add_parser('import', help='Import benchmark output files')
+    imp.add_argument('files', nargs='+', help='Benchmark output files')
+    imp.add_argument('--commit', help='Commit the benchmarks were built from')
+    imp.add_argument('--machine', default=platform.node(),
+                     help='Machine the benchmarks ran on (default: %(default)s)')
+    imp.add_argument('--time', type=float,
+                     help='Time of the run in seconds since the epoch (default: modification time of the file)')
+    imp.add_argument('--schema',
+                     default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'benchout.schema.json'),
+                     help='JSON file to validate the benchmark output files (default: %(default)s)')
+
+    qry = subparsers.add_parser('query', help='Print the history of a function')
+    qry.add_argument('function', help='Function name')
+    qry.add_argument('variant', nargs='?',
+                     help='Function variant name (default: all variants)')
+    qry.add_argument('--stat', default='mean',
+                     help='Statistic to print (default: %(default)s)')
+    qry.add_argument('--machine', help='Only print results from this machine')
+    qry.add_argument('--commit', help='Only print results for this commit')
+    qry.add_argument('--format', default='text', choices=export.FORMATS,
+                     help='Output format (default: %(default)s)')
+
+    args = parser.parse_args(args)
+    if args.action == 'import':
+        return do_import(args)
+    if args.action == 'query':
+        return do_query(args)
+    parser.print_usage(sys.stderr)
+    return os.EX_USAGE
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
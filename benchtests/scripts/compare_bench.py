@@ -19,13 +19,24 @@
 
 Given two benchmark result files and a threshold, this script compares the
 benchmark results and flags differences in performance beyond a given
-threshold.
+threshold.  If more than one file is given after the first one, each of
+them is compared against the first in a pool of worker processes and the
+results are printed together.
 """
+from __future__ import print_function
 import sys
 import os
-import pylab
+import base64
+import multiprocessing
+import struct
 import import_bench as bench
+import export_bench as export
 import argparse
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+# State shared by the worker processes of a multiple file comparison.
+_worker = {}
 
 def do_compare(func, var, tl1, tl2, par, threshold):
     """Compare one of the aggregate measurements
@@ -41,24 +52,28 @@ def do_compare(func, var, tl1, tl2, par, threshold):
         par: The aggregate to measure
         threshold: The threshold for differences, beyond which the script should
         print a warning.
+    Return:
+        The comparison record or None if the aggregate could not be
+        compared.
     """
     try:
         v1 = tl1[str(par)]
         v2 = tl2[str(par)]
-        d = abs(v2 - v1) * 100 / v1
+        d = (v2 - v1) * 100 / v1
     except KeyError:
         sys.stderr.write('%s(%s)[%s]: stat does not exist\n' % (func, var, par))
-        return
+        return None
     except ZeroDivisionError:
-        return
+        return None
 
-    if d > threshold:
+    verdict = 'same'
+    if abs(d) > threshold:
         if v1 > v2:
-            ind = '+++'
+            verdict = 'improvement'
         else:
-            ind = '---'
-        print('%s %s(%s)[%s]: (%.2lf%%) from %g to %g' %
-                (ind, func, var, par, d, v1, v2))
+            verdict = 'regression'
+    return {'function': func, 'variant': var, 'stat': par, 'before': v1,
+            'after': v2, 'delta': d, 'verdict': verdict}
 
 
 def compare_runs(pts1, pts2, threshold, stats):
@@ -67,7 +82,15 @@ def compare_runs(pts1, pts2, threshold, stats):
     Args:
         pts1: Timing data from first machine
         pts2: Timing data from second machine
+        threshold: The threshold for differences in percent
+        stats: Space separated list of statistics to compare
+    Return:
+        The list of comparison records.  Compressed timings are compared
+        pairwise and their records have an index key.  If the numbers of
+        compressed timings differ, a single record with the verdict
+        'changed' and both lists of timings is returned for the variant.
     """
+    records = []
 
     # XXX We assume that the two benchmarks have identical functions and
     # variants.  We cannot compare two benchmarks that may have different
@@ -77,10 +100,30 @@ def compare_runs(pts1, pts2, threshold, stats):
             tl1 = pts1['functions'][func][var]
             tl2 = pts2['functions'][func][var]
 
+            # Runs on different numbers of threads cannot be compared.
+            rec = bench.thread_mismatch(tl1, tl2)
+            if rec:
+                rec['function'] = func
+                rec['variant'] = var
+                records.append(rec)
+                continue
+
             # Compare the consolidated numbers
             # do_compare(func, var, tl1, tl2, 'max', threshold)
-            for stat in stats.split():
-                do_compare(func, var, tl1, tl2, stat, threshold)
+            for stat in bench.variant_stats(stats.split(), tl1):
+                rec = do_compare(func, var, tl1, tl2, stat, threshold)
+                if rec:
+                    if 'threads' in tl1:
+                        rec['threads'] = tl1['threads']
+                    records.append(rec)
+
+            # Compare the hardware counters both runs have.
+            c1 = tl1.get('counters', {})
+            c2 = tl2.get('counters', {})
+            for name in sorted(set(c1) & set(c2)):
+                rec = do_compare(func, var, c1, c2, name, threshold)
+                if rec:
+                    records.append(rec)
 
             # Skip over to the next variant or function if there is no detailed
             # timing info for the function variant.
@@ -95,40 +138,209 @@ def compare_runs(pts1, pts2, threshold, stats):
             # happen on an idle machine with identical hardware and
             # configuration, but ideal environments are hard to come by.
             if len(tl1['timings']) != len(tl2['timings']):
-                print('* %s(%s): Timing characteristics changed' %
-                        (func, var))
-                print('\tBefore: [%s]' %
-                        ', '.join([str(x) for x in tl1['timings']]))
-                print('\tAfter: [%s]' %
-                        ', '.join([str(x) for x in tl2['timings']]))
+                records.append({'function': func, 'variant': var,
+                                'stat': 'timings', 'before': None,
+                                'after': None, 'delta': None,
+                                'verdict': 'changed',
+                                'before-timings': list(tl1['timings']),
+                                'after-timings': list(tl2['timings'])})
                 continue
 
-            # Collect numbers whose differences cross the threshold we have
-            # set.
-            issues = [(x, y) for x, y in zip(tl1['timings'], tl2['timings']) \
-                        if abs(y - x) * 100 / x > threshold]
+            # Compare the numbers pairwise and flag those whose differences
+            # cross the threshold we have set.
+            for i, (t1, t2) in enumerate(zip(tl1['timings'],
+                                             tl2['timings'])):
+                d = (t2 - t1) * 100 / t1
+                verdict = 'same'
+                if abs(d) > threshold:
+                    if t2 > t1:
+                        verdict = 'regression'
+                    else:
+                        verdict = 'improvement'
+                records.append({'function': func, 'variant': var,
+                                'stat': 'timings[%d]' % i, 'index': i,
+                                'before': t1, 'after': t2, 'delta': d,
+                                'verdict': verdict})
 
-            # Now print them.
-            for t1, t2 in issues:
-                d = abs(t2 - t1) * 100 / t1
-                if t2 > t1:
-                    ind = '-'
-                else:
-                    ind = '+'
+    return records
+
+
+def format_record(rec):
+    """Format a comparison record as text
+
+    Only records of changes are printed.
 
-                print("%s %s(%s): (%.2lf%%) from %g to %g" %
-                        (ind, func, var, d, t1, t2))
+    Args:
+        rec: The comparison record
+    Return:
+        The text for the record, which is empty for unchanged results.
+    """
+    func = rec['function']
+    var = rec['variant']
+    verdict = rec['verdict']
+
+    if verdict == 'changed':
+        return ('* %s(%s): Timing characteristics changed\n'
+                '\tBefore: [%s]\n'
+                '\tAfter: [%s]\n'
+                % (func, var,
+                   ', '.join([str(x) for x in rec['before-timings']]),
+                   ', '.join([str(x) for x in rec['after-timings']])))
+    if verdict == 'missing':
+        return '* %s(%s): Missing from the second bench\n' % (func, var)
+    if verdict == 'mismatch':
+        return ('* %s(%s): Run on %d threads before and %d threads after\n'
+                % (func, var, rec['before'], rec['after']))
+    if verdict not in ('improvement', 'regression'):
+        return ''
+
+    if 'index' in rec:
+        ind = '+' if verdict == 'improvement' else '-'
+        text = "%s %s(%s): (%.2lf%%) from %g to %g" % (ind, func, var,
+                abs(rec['delta']), rec['before'], rec['after'])
+    else:
+        ind = '+++' if verdict == 'improvement' else '---'
+        text = '%s %s(%s)[%s]: (%.2lf%%) from %g to %g' % (ind, func, var,
+                rec['stat'], abs(rec['delta']), rec['before'], rec['after'])
+    if 'p-value' in rec:
+        text += ' (p = %.3g)' % rec['p-value']
+    if 'threads' in rec:
+        text += ' on %d threads' % rec['threads']
+    return text + '\n'
+
+
+def write_results(records, fmt, out=sys.stdout, fields=export.FIELDS,
+                  header=True):
+    """Write out comparison records
+
+    Args:
+        records: The list of comparison records
+        fmt: The output format, one of export_bench.FORMATS
+        out: The file to write to
+        fields: The fields written in CSV format
+        header: Whether to write the CSV header line
+    """
+    if fmt == 'text':
+        out.write(''.join([format_record(r) for r in records]))
+    else:
+        export.write_records(out, fmt, records, fields, header)
 
 
-def plot_graphs(bench1, bench2):
+def plot_graph(job):
+    """Plot the graph for a function variant
+
+    Make a scatter plot of the timings of a function variant from both
+    runs.  This runs in a worker process and renders the plot with the Agg
+    backend, which does not need a display.
+
+    Args:
+        job: A tuple of the function name, the variant name and the two
+        lists of timings.
+    Return:
+        A tuple of the function name, the variant name and the PNG image.
+    """
+    func, var, timings1, timings2 = job
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import pylab
+
+    pylab.clf()
+    pylab.title('%s(%s)' % (func, var))
+    pylab.ylabel('Time (cycles)')
+
+    # First set of points
+    length = len(timings1)
+    X = [float(x) for x in range(length)]
+    lines = pylab.scatter(X, timings1, 1.5 + 100 / length)
+    pylab.setp(lines, 'color', 'r')
+
+    # Second set of points
+    length = len(timings2)
+    X = [float(x) for x in range(length)]
+    lines = pylab.scatter(X, timings2, 1.5 + 100 / length)
+    pylab.setp(lines, 'color', 'g')
+
+    image = BytesIO()
+    pylab.savefig(image, format='png')
+    return func, var, image.getvalue()
+
+
+def write_pdf(filename, images):
+    """Write graphs into a single PDF file with one page per graph
+
+    Args:
+        filename: Name of the PDF file
+        images: Iterable of tuples of function name, variant name and PNG
+        image
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.image
+    import pylab
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    pdf = PdfPages(filename)
+    try:
+        for func, var, image in images:
+            img = matplotlib.image.imread(BytesIO(image), format='png')
+            height, width = img.shape[:2]
+            fig = pylab.figure(figsize=(width / 100.0, height / 100.0),
+                               dpi=100)
+            fig.figimage(img)
+            pdf.savefig(fig)
+            pylab.close(fig)
+    finally:
+        pdf.close()
+
+
+def write_svg(filename, images):
+    """Write graphs into a single SVG file, one below the other
+
+    Args:
+        filename: Name of the SVG file
+        images: Iterable of tuples of function name, variant name and PNG
+        image
+    """
+    parts = []
+    width = 0
+    y = 0
+    for func, var, image in images:
+        # The PNG header stores the width and height at offset 16.
+        w, h = struct.unpack('>II', image[16:24])
+        parts.append('<image id="%s" x="0" y="%d" width="%d" height="%d" '
+                     'xlink:href="data:image/png;base64,%s"><title>%s'
+                     '</title></image>\n'
+                     % (escape('%s-%s' % (func, var), {'"': '&quot;'}), y,
+                        w, h, base64.b64encode(image).decode('ascii'),
+                        escape('%s(%s)' % (func, var))))
+        width = max(width, w)
+        y += h
+
+    with open(filename, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<svg xmlns="http://www.w3.org/2000/svg" '
+                'xmlns:xlink="http://www.w3.org/1999/xlink" '
+                'width="%d" height="%d">\n' % (width, y))
+        f.write(''.join(parts))
+        f.write('</svg>\n')
+
+
+def plot_graphs(bench1, bench2, jobs, output=None):
     """Plot graphs for functions
 
-    Make scatter plots for the functions and their variants.
+    Make scatter plots for the functions and their variants.  The plots are
+    rendered in a pool of worker processes and written out either as a PNG
+    file per function variant or into a single PDF or SVG file.
 
     Args:
         bench1: Set of points from the first machine
         bench2: Set of points from the second machine.
+        jobs: Number of worker processes
+        output: Name of a .pdf or .svg file to write all graphs to, or None
+        to write a PNG file for each function variant.
     """
+    work = []
     for func in bench1['functions'].keys():
         for var in bench1['functions'][func].keys():
             # No point trying to print a graph if there are no detailed
@@ -137,40 +349,159 @@ def plot_graphs(bench1, bench2):
                 sys.stderr.write('Skipping graph for %s(%s)\n' % (func, var))
                 continue
 
-            pylab.clf()
-            pylab.ylabel('Time (cycles)')
-
-            # First set of points
-            length = len(bench1['functions'][func][var]['timings'])
-            X = [float(x) for x in range(length)]
-            lines = pylab.scatter(X, bench1['functions'][func][var]['timings'],
-                    1.5 + 100 / length)
-            pylab.setp(lines, 'color', 'r')
-
-            # Second set of points
-            length = len(bench2['functions'][func][var]['timings'])
-            X = [float(x) for x in range(length)]
-            lines = pylab.scatter(X, bench2['functions'][func][var]['timings'],
-                    1.5 + 100 / length)
-            pylab.setp(lines, 'color', 'g')
-
-            if var:
-                filename = "%s-%s.png" % (func, var)
+            work.append((func, var,
+                         list(bench1['functions'][func][var]['timings']),
+                         list(bench2['functions'][func][var]['timings'])))
+
+    if not work:
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        images = pool.imap(plot_graph, work)
+        if output is None:
+            for func, var, image in images:
+                if var:
+                    filename = "%s-%s.png" % (func, var)
+                else:
+                    filename = "%s.png" % func
+                sys.stderr.write('Writing out %s\n' % filename)
+                with open(filename, 'wb') as f:
+                    f.write(image)
+        else:
+            sys.stderr.write('Writing out %s\n' % output)
+            if output.endswith('.pdf'):
+                write_pdf(output, images)
             else:
-                filename = "%s.png" % func
-            sys.stderr.write('Writing out %s' % filename)
-            pylab.savefig(filename)
+                write_svg(output, images)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def prepare(pts, args):
+    """Prepare a parsed benchmark run for comparison
+
+    The threshold comparison works on compressed timings while the
+    statistical comparison needs the raw timings.  The percentiles of the
+    time per call are added as statistics for variants with a histogram.
+
+    Args:
+        pts: The parsed benchmark run
+        args: The parsed command line arguments
+    """
+    bench.add_percentiles(pts)
+    if args.method == 'threshold':
+        bench.compress_timings(pts)
+
+
+def compare(pts1, pts2, args):
+    """Compare two prepared benchmark runs with the selected method
+
+    Args:
+        pts1: Timing data from first machine
+        pts2: Timing data from second machine
+        args: The parsed command line arguments
+    Return:
+        The list of comparison records.
+    """
+    if args.method == 'stats':
+        import compare_stats
+        return compare_stats.compare_runs(pts1, pts2, args.threshold,
+                                          args.stats, args.alpha,
+                                          args.resamples, args.seed)
+    return compare_runs(pts1, pts2, args.threshold, args.stats)
+
 
-def main(bench1, bench2, schema, threshold, stats):
-    bench1 = bench.parse_bench(bench1, schema)
-    bench2 = bench.parse_bench(bench2, schema)
+def init_worker(baseline, args):
+    """Set up a worker process for a multiple file comparison
 
-    plot_graphs(bench1, bench2)
+    Args:
+        baseline: The parsed and prepared baseline benchmark
+        args: The parsed command line arguments
+    """
+    _worker['baseline'] = baseline
+    _worker['args'] = args
 
-    bench.compress_timings(bench1)
-    bench.compress_timings(bench2)
 
-    compare_runs(bench1, bench2, threshold, stats)
+def compare_candidate(filename):
+    """Compare a benchmark file against the baseline in a worker process
+
+    Args:
+        filename: Name of the benchmark output file to compare
+    Return:
+        A tuple of the file name, the list of comparison records and an
+        error message, which is None on success.
+    """
+    args = _worker['args']
+    try:
+        candidate = bench.parse_bench(filename, args.schema, args.stream)
+        prepare(candidate, args)
+        records = compare(_worker['baseline'], candidate, args)
+    except (IOError, ValueError, KeyError,
+            bench.validator.ValidationError) as e:
+        return filename, [], '%s: %s' % (type(e).__name__, e)
+    return filename, records, None
+
+
+def compare_many(args):
+    """Compare a number of benchmark files against a baseline
+
+    The baseline is parsed once and shared with a pool of worker processes
+    that parse and compare the other files.  The comparisons are printed
+    in the order of the files.  In the JSON and CSV formats, each record
+    gets a candidate field with the name of the file it comes from.
+
+    Args:
+        args: The parsed command line arguments
+    Return:
+        os.EX_OK on success or os.EX_DATAERR if any of the files could not
+        be compared.
+    """
+    baseline = bench.parse_bench(args.bench1, args.schema, args.stream)
+    prepare(baseline, args)
+
+    pool = multiprocessing.Pool(args.jobs, init_worker, (baseline, args))
+    ret = os.EX_OK
+    header = True
+    try:
+        for filename, records, error in pool.imap(compare_candidate,
+                                                  args.bench2):
+            if args.format == 'text':
+                sys.stdout.write('Comparing %s with %s:\n'
+                                 % (args.bench1, filename))
+            for rec in records:
+                rec['candidate'] = filename
+            write_results(records, args.format,
+                          fields=['candidate'] + export.FIELDS,
+                          header=header)
+            header = False
+            if error:
+                sys.stderr.write('%s: %s\n' % (filename, error))
+                ret = os.EX_DATAERR
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return ret
+
+
+def main(args):
+    if len(args.bench2) > 1:
+        return compare_many(args)
+
+    bench1 = bench.parse_bench(args.bench1, args.schema, args.stream)
+    bench2 = bench.parse_bench(args.bench2[0], args.schema, args.stream)
+
+    if args.graph or args.graph_output:
+        plot_graphs(bench1, bench2, args.jobs, args.graph_output)
+
+    prepare(bench1, args)
+    prepare(bench2, args)
+
+    write_results(compare(bench1, bench2, args), args.format)
+    return os.EX_OK
 
 
 if __name__ == '__main__':
@@ -178,15 +509,27 @@ if __name__ == '__main__':
 
     # Required parameters
     parser.add_argument('bench1', help='First bench to compare')
-    parser.add_argument('bench2', help='Second bench to compare')
+    parser.add_argument('bench2', nargs='+', help='Second bench to compare.  If more than one is given, each is compared against the first bench and no graphs are plotted')
 
     # Optional parameters
     parser.add_argument('--schema',
                         default=os.path.join(os.path.dirname(os.path.realpath(__file__)),'benchout.schema.json'),
                         help='JSON file to validate source/dest files (default: %(default)s)')
     parser.add_argument('--threshold', default=10.0, type=float, help='Only print those with equal or higher threshold (default: %(default)s)')
-    parser.add_argument('--stats', default='min mean', type=str, help='Only consider values from the statistics specified as a space separated list (default: %(default)s)')
+    parser.add_argument('--stats', default='min mean', type=str, help='Only consider values from the statistics specified as a space separated list, which may include the percentiles p50, p99 and p999 (default: %(default)s)')
+    parser.add_argument('--stream', action='store_true', help='Parse the benchmark files incrementally to reduce memory usage with detailed timings')
+    parser.add_argument('-j', '--jobs', default=multiprocessing.cpu_count(), type=int, help='Number of worker processes when comparing more than two benches (default: %(default)s)')
+    parser.add_argument('--method', default='threshold', choices=['threshold', 'stats'], help='Compare aggregates and compressed timings against the threshold, or compare the distributions of the detailed timings statistically (default: %(default)s)')
+    parser.add_argument('--alpha', default=0.01, type=float, help='Significance level of the statistical comparison (default: %(default)s)')
+    parser.add_argument('--resamples', default=1000, type=int, help='Number of bootstrap resamples of the statistical comparison (default: %(default)s)')
+    parser.add_argument('--seed', default=0, type=int, help='Seed for the bootstrap resamples (default: %(default)s)')
+    parser.add_argument('--format', default='text', choices=export.FORMATS, help='Print the changes as text, or all comparisons as JSON lines or CSV (default: %(default)s)')
+    parser.add_argument('-g', '--graph', action='store_true', help='Plot a graph of the detailed timings of each function variant into a PNG file')
+    parser.add_argument('--graph-output', metavar='FILE', help='Plot the graphs into a single multi-page PDF or SVG file instead, depending on the extension of %(metavar)s')
 
     args = parser.parse_args()
+    if (args.graph_output
+        and os.path.splitext(args.graph_output)[1] not in ('.pdf', '.svg')):
+        parser.error('--graph-output must be a .pdf or .svg file')
 
-    main(args.bench1, args.bench2, args.schema, args.threshold, args.stats)
+    sys.exit(main(args))
@@ -0,0 +1,228 @@
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Statistical comparison of benchmark timings
+
+Compare the detailed timings of two benchmark runs as distributions rather
+than point by point.  A change of a function variant is only reported if
+the Mann-Whitney U test finds the two sets of timings to be significantly
+different, the bootstrap confidence interval of the relative change of the
+median does not include zero and the change of the median is beyond the
+threshold.  Since neither test pairs
+up individual timings, runs with different numbers of timings can be
+compared.
+
+The results are returned as comparison records, see export_bench.
+"""
+
+from __future__ import print_function
+import math
+import import_bench as bench
+try:
+    import numpy
+except ImportError:
+    print('Could not find numpy module.')
+    raise
+
+# Limit on the number of elements in a batch of bootstrap resamples.
+BOOTSTRAP_BATCH = 1 << 22
+
+
+def mann_whitney(t1, t2):
+    """Two sided Mann-Whitney U test
+
+    Use the normal approximation with a correction for ties and for
+    continuity, which is accurate for the sample sizes of detailed
+    benchmark timings.
+
+    Args:
+        t1: NumPy array of the first set of timings
+        t2: NumPy array of the second set of timings
+    Return:
+        A tuple of the U statistic of the first set and the p-value.
+    """
+    n1 = len(t1)
+    n2 = len(t2)
+    n = n1 + n2
+    values, inverse, counts = numpy.unique(numpy.concatenate((t1, t2)),
+                                           return_inverse=True,
+                                           return_counts=True)
+    # Large groups of ties are common with quantized timings, and the cube
+    # of their size overflows 64-bit integers.
+    counts = counts.astype(numpy.float64)
+    # Tied values all get the average of the ranks they span.
+    ranks = numpy.cumsum(counts) - (counts - 1) / 2.0
+    u1 = ranks[inverse[:n1]].sum() - n1 * (n1 + 1) / 2.0
+
+    mu = n1 * n2 / 2.0
+    ties = (counts ** 3 - counts).sum()
+    var = n1 * n2 / 12.0 * ((n + 1) - ties / float(n * (n - 1)))
+    if var <= 0:
+        return u1, 1.0
+    z = (abs(u1 - mu) - 0.5) / math.sqrt(var)
+    return u1, min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+def bootstrap_medians(t, resamples, rng):
+    """Compute the medians of bootstrap resamples of a set of timings
+
+    Resamples are drawn in batches to bound memory usage.
+
+    Args:
+        t: NumPy array of timings
+        resamples: Number of resamples
+        rng: The numpy.random.RandomState to draw resamples with
+    Return:
+        A NumPy array of RESAMPLES medians.
+    """
+    n = len(t)
+    batch = max(1, BOOTSTRAP_BATCH // n)
+    medians = []
+    for start in range(0, resamples, batch):
+        rows = min(batch, resamples - start)
+        idx = rng.randint(0, n, size=(rows, n))
+        medians.append(numpy.median(t[idx], axis=1))
+    return numpy.concatenate(medians)
+
+
+def compare_variant(t1, t2, threshold, alpha, resamples, rng):
+    """Compare the timings of a function variant from two runs
+
+    Args:
+        t1: Timings from the first run
+        t2: Timings from the second run
+        threshold: The smallest relative change of the median in percent
+        that is reported
+        alpha: The significance level of the tests
+        resamples: Number of bootstrap resamples
+        rng: The numpy.random.RandomState to draw resamples with
+    Return:
+        A comparison record of the medians without the function and
+        variant names, with additional statistics.
+    """
+    t1 = numpy.asarray(t1, dtype=numpy.float64)
+    t2 = numpy.asarray(t2, dtype=numpy.float64)
+    med1 = numpy.median(t1)
+    med2 = numpy.median(t2)
+    u, p = mann_whitney(t1, t2)
+
+    # Confidence interval of the relative change of the median.
+    change = (bootstrap_medians(t2, resamples, rng)
+              / bootstrap_medians(t1, resamples, rng) - 1) * 100
+    low, high = numpy.percentile(change, [alpha * 50, 100 - alpha * 50])
+
+    change = (med2 / med1 - 1) * 100
+    verdict = 'same'
+    if p < alpha:
+        if low > 0 and change > threshold:
+            verdict = 'regression'
+        elif high < 0 and change < -threshold:
+            verdict = 'improvement'
+
+    return {'stat': 'median', 'before': float(med1), 'after': float(med2),
+            'delta': float(change), 'verdict': verdict,
+            'method': 'mann-whitney',
+            'before-min': float(t1.min()), 'after-min': float(t2.min()),
+            'before-count': len(t1), 'after-count': len(t2),
+            'delta-ci': [float(low), float(high)],
+            'u': float(u), 'p-value': float(p)}
+
+
+def compare_stat(v1, v2, threshold):
+    """Compare an aggregate measurement of a variant without timings
+
+    Args:
+        v1: The value from the first run
+        v2: The value from the second run
+        threshold: The smallest relative change in percent that is reported
+    Return:
+        A comparison record without the function, variant and stat names.
+    """
+    change = (v2 - v1) * 100.0 / v1
+    verdict = 'same'
+    if change > threshold:
+        verdict = 'regression'
+    elif change < -threshold:
+        verdict = 'improvement'
+    return {'before': v1, 'after': v2, 'delta': change, 'verdict': verdict,
+            'method': 'threshold'}
+
+
+def compare_runs(pts1, pts2, threshold, stats, alpha, resamples, seed):
+    """Compare two benchmark runs statistically
+
+    Variants with detailed timings in both runs are compared with
+    compare_variant, the others fall back to comparing the aggregate
+    measurements in STATS against the threshold.  Variants that only exist
+    in one of the runs are reported as missing.
+
+    Args:
+        pts1: Timing data from first machine
+        pts2: Timing data from second machine
+        threshold: The threshold for differences in percent
+        stats: Space separated list of statistics to compare for variants
+        without detailed timings
+        alpha: The significance level of the tests
+        resamples: Number of bootstrap resamples
+        seed: Seed for the bootstrap resamples
+    Return:
+        The list of comparison records.
+    """
+    rng = numpy.random.RandomState(seed)
+    records = []
+    for func in sorted(pts1['functions'].keys()):
+        for var in sorted(pts1['functions'][func].keys()):
+            tl1 = pts1['functions'][func][var]
+            tl2 = pts2['functions'].get(func, {}).get(var)
+            mismatch = tl2 is not None and bench.thread_mismatch(tl1, tl2)
+
+            if tl2 is None:
+                rec = {'stat': None, 'before': None, 'after': None,
+                       'delta': None, 'verdict': 'missing'}
+                res = [rec]
+            elif mismatch:
+                res = [mismatch]
+            elif ('timings' in tl1 and 'timings' in tl2
+                  and len(tl1['timings']) > 1 and len(tl2['timings']) > 1):
+                res = [compare_variant(tl1['timings'], tl2['timings'],
+                                       threshold, alpha, resamples, rng)]
+            else:
+                res = []
+                for stat in bench.variant_stats(stats.split(), tl1):
+                    if stat not in tl1 or stat not in tl2 or not tl1[stat]:
+                        continue
+                    rec = compare_stat(tl1[stat], tl2[stat], threshold)
+                    rec['stat'] = stat
+                    if 'threads' in tl1:
+                        rec['threads'] = tl1['threads']
+                    res.append(rec)
+
+            if tl2 is not None and not mismatch:
+                c1 = tl1.get('counters', {})
+                c2 = tl2.get('counters', {})
+                for name in sorted(set(c1) & set(c2)):
+                    if not c1[name]:
+                        continue
+                    rec = compare_stat(c1[name], c2[name], threshold)
+                    rec['stat'] = name
+                    res.append(rec)
+
+            for rec in res:
+                rec['function'] = func
+                rec['variant'] = var
+            records.extend(res)
+
+    return records
@@ -20,6 +20,16 @@
 Given a string benchmark result file, print a table with comparisons with a
 baseline.  The baseline is the first function, which typically is the builtin
 function.
+
+With --summary, print for each range of sizes, grouped by powers of two,
+the geometric mean of the speedup of each ifunc over the baseline and the
+fastest ifunc, followed by a selection table of the size ranges where each
+ifunc is the fastest.
+
+With --compare, compare the timings of each ifunc in the result file given
+by --input against those in a second result file of another run of the same
+benchmarks, matching the results by the values of their attributes, and flag
+the differences beyond a threshold.
 """
 import matplotlib as mpl
 mpl.use('Agg')
@@ -30,21 +40,20 @@ import json
 import pylab
 import argparse
 import traceback
-
+import export_bench as export
+import import_bench
 try:
-    import jsonschema as validator
+    import numpy
 except ImportError:
-    print('Could not find jsonschema module.')
+    print('Could not find numpy module.')
     raise
 
 
 def parse_file(filename, schema_filename):
     try:
-        with open(schema_filename, 'r') as schemafile:
-            schema = json.load(schemafile)
-            with open(filename, 'r') as benchfile:
-                bench = json.load(benchfile)
-                validator.validate(bench, schema)
+        with open(filename, 'r') as benchfile:
+            bench = json.load(benchfile)
+            import_bench.validate(bench, schema_filename)
         return bench
     except:
         print(traceback.format_exc(limit=1))
@@ -83,81 +92,404 @@ def draw_graph(f, v, ifuncs, results):
     pylab.savefig('%s-%s.png' % (f, v), bbox_inches='tight')
 
 
-def process_results(results, attrs, funcs, base_func, graph, no_diff, no_header):
+# Fields of the records written in CSV format.
+FIELDS = ['function', 'variant', 'attributes', 'ifunc', 'stat', 'before',
+          'after', 'delta', 'verdict']
+
+# Fields of the summary records written in CSV format.
+SUMMARY_FIELDS = ['function', 'variant', 'sizes', 'ifunc', 'speedup',
+                  'fastest']
+
+
+def result_table(res, attrs):
+    """Get the results of a function as columns
+
+    Args:
+        res: The function results
+        attrs: Attributes that form the test criteria
+    Return:
+        A tuple of the list of the values of ATTRS of each result, formatted
+        as 'attr=value' strings separated by commas, and a numpy array of
+        the timings with a row per result and a column per ifunc.
+    """
+    results = res['results']
+    try:
+        columns = [[r[a] for r in results] for a in attrs]
+    except KeyError as ke:
+        r = [r for r in results if ke.args[0] not in r][0]
+        sys.stderr.write('Invalid -a %s parameter. Options: %s.\n'
+                         % (ke, ', '.join([a for a in r.keys() if a != 'timings'])))
+        sys.exit(os.EX_DATAERR)
+    key_fmt = ', '.join(['%s=%%s' % a.replace('%', '%%') for a in attrs])
+    keys = [key_fmt % vals for vals in zip(*columns)]
+    timings = numpy.array([r['timings'] for r in results],
+                          dtype=numpy.float64)
+    return keys, timings.reshape(len(results), len(res['ifuncs']))
+
+
+def attribute_column(res, attr, option):
+    """Get the values of an attribute of the results of a function
+
+    Args:
+        res: The function results
+        attr: The attribute
+        option: The command line option that selected ATTR
+    Return:
+        A numpy array of the values.
+    """
+    try:
+        return numpy.array([r[attr] for r in res['results']],
+                           dtype=numpy.float64)
+    except KeyError:
+        r = [r for r in res['results'] if attr not in r][0]
+        sys.stderr.write('Invalid %s %s parameter. Options: %s.\n'
+                         % (option, attr, ', '.join([a for a in r.keys()
+                                                     if a != 'timings'])))
+        sys.exit(os.EX_DATAERR)
+
+
+def percent_of(diff, base):
+    """Compute DIFF in percent of BASE, or zero where BASE is zero"""
+    nonzero = base != 0
+    return numpy.where(nonzero, diff * 100 / numpy.where(nonzero, base, 1),
+                       0.0)
+
+
+def format_rows(keys, cells):
+    """Format a table with a row per result
+
+    Args:
+        keys: The attribute values of the results
+        cells: A list of (fmt, columns) tuples for each cell of a row, with
+        COLUMNS the list of arrays of the values formatted by FMT
+    Return:
+        The list of formatted rows.
+    """
+    columns = [c for fmt, cols in cells for c in cols]
+    vals = numpy.empty((len(keys), len(columns)), dtype=object)
+    for n, c in enumerate(columns):
+        vals[:, n] = c
+    row_fmt = '%36s: ' + ''.join([fmt for fmt, cols in cells]) + '\n'
+    return [row_fmt % ((k,) + tuple(v)) for k, v in zip(keys, vals.tolist())]
+
+
+def select_ifuncs(all_ifuncs, funcs, base_func):
+    """Select the ifuncs to compare and the baseline
+
+    Args:
+        all_ifuncs: The names of the ifuncs of a function
+        funcs: Names of the selected ifuncs, or None for all of them
+        base_func: Name of the baseline ifunc, or None for the first
+        selected ifunc
+    Return:
+        A tuple of the list of indices of the selected ifuncs and the index
+        of the baseline.
+    """
+    if funcs:
+        selected = [i for i, name in enumerate(all_ifuncs) if name in funcs]
+    else:
+        selected = list(range(len(all_ifuncs)))
+    base_index = selected[0] if selected else 0
+
+    if base_func:
+        try:
+            base_index = all_ifuncs.index(base_func)
+        except ValueError:
+            sys.stderr.write('Invalid -b "%s" parameter. Options: %s.\n' %
+                             (base_func, ', '.join(all_ifuncs)))
+            sys.exit(os.EX_DATAERR)
+    return selected, base_index
+
+
+def format_range(low, high):
+    """Format a range of sizes"""
+    if low == high:
+        return '%d' % low
+    return '%d-%d' % (low, high)
+
+
+def summarize(res, size_attr, selected, base_index):
+    """Compute the speedups of the ifuncs of a function per range of sizes
+
+    Args:
+        res: The function results
+        size_attr: The attribute with the size of a result
+        selected: Indices of the ifuncs to summarize
+        base_index: Index of the baseline ifunc
+    Return:
+        A list of (low, high, speedups, fastest) tuples in ascending order
+        of sizes, where SPEEDUPS is the list of geometric means of the
+        speedups of the selected ifuncs over the baseline and FASTEST is
+        the index in SELECTED of the ifunc with the largest speedup.
+    """
+    sizes = attribute_column(res, size_attr, '--size-attr')
+    timings = result_table(res, [])[1]
+    if not selected:
+        return []
+    base = timings[:, base_index]
+    t = timings[:, selected]
+    valid = (base > 0) & (t > 0).all(axis=1)
+    logs = numpy.log(base[valid, None] / t[valid])
+
+    # The ranges of sizes are [2^(E-1), 2^E - 1] for the binary exponent E
+    # of the sizes, and [0, 0] for sizes below 1.
+    sizes = numpy.floor(sizes[valid])
+    exps = numpy.where(sizes >= 1, numpy.frexp(sizes)[1], 0)
+    buckets, inverse, counts = numpy.unique(exps, return_inverse=True,
+                                            return_counts=True)
+    sums = numpy.zeros((len(buckets), len(selected)))
+    numpy.add.at(sums, inverse.ravel(), logs)
+    speedups = numpy.exp(sums / counts[:, None])
+    fastest = numpy.argmax(speedups, axis=1)
+
+    rows = []
+    for e, s, n in zip(buckets.tolist(), speedups.tolist(), fastest.tolist()):
+        low = 1 << (e - 1) if e else 0
+        rows.append((low, max(2 * low - 1, 0), s, n))
+    return rows
+
+
+def selection_table(rows):
+    """Merge adjacent size ranges with the same fastest ifunc
+
+    Ranges are only merged if they are contiguous, so that the selection
+    does not cover sizes without any results.
+
+    Args:
+        rows: The summary rows as returned by summarize
+    Return:
+        A list of (low, high, fastest) tuples.
+    """
+    table = []
+    for low, high, speedups, fastest in rows:
+        if (table and table[-1][2] == fastest
+            and table[-1][1] + 1 == low):
+            table[-1] = (table[-1][0], high, fastest)
+        else:
+            table.append((low, high, fastest))
+    return table
+
+
+def print_summary(results, funcs, base_func, size_attr, no_header,
+                  fmt='text'):
+    """Print the speedups of the ifuncs per range of sizes
+
+    Args:
+        results: JSON dictionary of results
+        funcs: Functions that are selected
+        base_func: The baseline ifunc
+        size_attr: The attribute with the size of a result
+        no_header: Do not print the headers
+        fmt: The output format, one of export_bench.FORMATS
+    """
+    header = True
+    for f in results['functions'].keys():
+        res = results['functions'][f]
+        v = res['bench-variant']
+        all_ifuncs = res['ifuncs']
+        selected, base_index = select_ifuncs(all_ifuncs, funcs, base_func)
+        names = [all_ifuncs[i] for i in selected]
+        rows = summarize(res, size_attr, selected, base_index)
+
+        if fmt != 'text':
+            records = []
+            for low, high, speedups, fastest in rows:
+                for n, speedup in enumerate(speedups):
+                    records.append({'function': f, 'variant': v,
+                                    'sizes': format_range(low, high),
+                                    'ifunc': names[n], 'speedup': speedup,
+                                    'fastest': n == fastest})
+            export.write_records(sys.stdout, fmt, records, SUMMARY_FIELDS,
+                                 header and not no_header)
+            header = False
+            continue
+
+        width = max([len(n) for n in names] + [8])
+        out = []
+        if not no_header:
+            out.append('Function: %s\n' % f)
+            out.append('Variant: %s\n' % v)
+            out.append('Baseline: %s\n' % all_ifuncs[base_index])
+            out.append('%-16s%-*s  %s\n' % (size_attr, width, 'fastest',
+                                          '  '.join(['%*s' % (width, n)
+                                                     for n in names])))
+            out.append('=' * (18 + (width + 2) * (len(names) + 1)) + '\n')
+        for low, high, speedups, fastest in rows:
+            out.append('%-16s%-*s  %s\n' % (format_range(low, high), width,
+                                          names[fastest],
+                                          '  '.join(['%*.3f' % (width, x)
+                                                     for x in speedups])))
+        out.append('\nSelection:\n')
+        for low, high, fastest in selection_table(rows):
+            out.append('%16s: %s\n' % (format_range(low, high),
+                                        names[fastest]))
+        out.append('\n')
+        sys.stdout.write(''.join(out))
+
+
+def compare_results(results1, results2, attrs, funcs, threshold, no_diff,
+                    no_header, fmt='text'):
+    """Compare the results of two runs of string benchmarks and print them
+
+    The results of the functions and ifuncs present in both runs are
+    matched by the values of their attributes.  A record is written for
+    each timing of a selected ifunc, with the relative change from the
+    first run as delta and a verdict of same if it is within THRESHOLD.
+
+    Args:
+        results1: JSON dictionary of results of the first run
+        results2: JSON dictionary of results of the second run
+        attrs: Attributes that form the test criteria
+        funcs: Functions that are selected
+        threshold: The threshold for differences in percent
+        no_diff: Do not print the differences
+        no_header: Do not print the headers
+        fmt: The output format, one of export_bench.FORMATS
+    """
+    header = True
+    for f in results1['functions'].keys():
+        if f not in results2['functions']:
+            sys.stderr.write('%s: not in the second run\n' % f)
+            continue
+        res1 = results1['functions'][f]
+        res2 = results2['functions'][f]
+        v = res2['bench-variant']
+        if res1['bench-variant'] != v:
+            sys.stderr.write('%s: variant %s compared with %s\n'
+                             % (f, res1['bench-variant'], v))
+
+        ifuncs = [i for i in res1['ifuncs'] if i in res2['ifuncs']
+                  and (not funcs or i in funcs)]
+        cols1 = [res1['ifuncs'].index(i) for i in ifuncs]
+        cols2 = [res2['ifuncs'].index(i) for i in ifuncs]
+        keys1, timings1 = result_table(res1, attrs)
+        keys2, timings2 = result_table(res2, attrs)
+
+        index2 = {}
+        for keys, index in ((keys1, {}), (keys2, index2)):
+            for n, key in enumerate(keys):
+                if key in index:
+                    sys.stderr.write('%s: More than one result with %s, add '
+                                     'attributes with -a.\n' % (f, key))
+                    sys.exit(os.EX_DATAERR)
+                index[key] = n
+        rows1 = [n for n, key in enumerate(keys1) if key in index2]
+        rows2 = [index2[keys1[n]] for n in rows1]
+        keys = [keys1[n] for n in rows1]
+        missing = len(keys1) + len(keys2) - 2 * len(keys)
+        if missing:
+            sys.stderr.write('%s: %d results not in both runs\n'
+                             % (f, missing))
+
+        before = timings1[rows1][:, cols1]
+        after = timings2[rows2][:, cols2]
+        delta = percent_of(after - before, before)
+        flagged = abs(delta) > threshold
+        verdict = numpy.where(flagged,
+                              numpy.where(after < before, 'improvement',
+                                          'regression'), 'same')
+
+        if fmt != 'text':
+            records = [{'function': f, 'variant': v, 'attributes': key,
+                        'ifunc': ifuncs[n], 'stat': 'timing', 'before': b,
+                        'after': a, 'delta': d, 'verdict': vd}
+                       for key, brow, arow, drow, vrow
+                       in zip(keys, before.tolist(), after.tolist(),
+                              delta.tolist(), verdict.tolist())
+                       for n, (b, a, d, vd)
+                       in enumerate(zip(brow, arow, drow, vrow))]
+            export.write_records(sys.stdout, fmt, records, FIELDS,
+                                 header and not no_header)
+            header = False
+            continue
+
+        out = []
+        if not no_header:
+            out.append('Function: %s\n' % f)
+            out.append('Variant: %s\n' % v)
+            out.append("%36s%s\n" % (' ', '\t'.join(ifuncs)))
+            out.append("=" * 120 + '\n')
+        marks = numpy.where(flagged, '*', ' ')
+        if no_diff:
+            cells = [('%12.2f\t', [after[:, n]]) for n in range(len(ifuncs))]
+        else:
+            cells = [('%12.2f (%+7.2f%%)%s\t',
+                      [after[:, n], delta[:, n], marks[:, n]])
+                     for n in range(len(ifuncs))]
+        out.extend(format_rows(keys, cells))
+        if not no_header:
+            out.append('%d timings beyond the threshold of %.2f%%\n\n'
+                       % (numpy.count_nonzero(flagged), threshold))
+        sys.stdout.write(''.join(out))
+
+
+def process_results(results, attrs, funcs, base_func, graph, no_diff,
+                    no_header, fmt='text'):
     """ Process results and print them
 
+    The timings of the selected ifuncs are compared with those of the
+    baseline for all the results at once, the text format only formats the
+    rows of the table.  In the JSON and CSV formats, a record is written for
+    each selected ifunc timing, with the timing of the baseline ifunc as
+    before and the relative change from it as delta.
+
     Args:
         results: JSON dictionary of results
         attrs: Attributes that form the test criteria
         funcs: Functions that are selected
+        fmt: The output format, one of export_bench.FORMATS
     """
 
+    header = True
     for f in results['functions'].keys():
 
         v = results['functions'][f]['bench-variant']
 
-        selected = {}
-        index = 0
-        base_index = 0
-        if funcs:
-            ifuncs = []
-            first_func = True
-            for i in results['functions'][f]['ifuncs']:
-                if i in funcs:
-                    if first_func:
-                        base_index = index
-                        first_func = False
-                    selected[index] = 1
-                    ifuncs.append(i)
-                else:
-                    selected[index] = 0
-                index += 1
+        all_ifuncs = results['functions'][f]['ifuncs']
+        indices, base_index = select_ifuncs(all_ifuncs, funcs, base_func)
+        ifuncs = [all_ifuncs[i] for i in indices]
+
+        keys, timings = result_table(results['functions'][f], attrs)
+        t = timings[:, indices]
+        base = timings[:, base_index]
+        is_base = numpy.array(indices, dtype=int) == base_index
+        diff = percent_of(base[:, None] - t, base[:, None])
+
+        if fmt != 'text':
+            delta = numpy.where(is_base, 0.0, -diff)
+            verdict = numpy.where(is_base, 'baseline',
+                                  numpy.where(diff > 0, 'improvement',
+                                              numpy.where(diff < 0,
+                                                          'regression',
+                                                          'same')))
+            records = [{'function': f, 'variant': v, 'attributes': key,
+                        'ifunc': ifuncs[n], 'stat': 'timing', 'before': b,
+                        'after': a, 'delta': d, 'verdict': vd}
+                       for key, b, arow, drow, vrow
+                       in zip(keys, base.tolist(), t.tolist(),
+                              delta.tolist(), verdict.tolist())
+                       for n, (a, d, vd) in enumerate(zip(arow, drow, vrow))]
+            export.write_records(sys.stdout, fmt, records, FIELDS,
+                                 header and not no_header)
+            header = False
         else:
-            ifuncs = results['functions'][f]['ifuncs']
-            for i in ifuncs:
-                selected[index] = 1
-                index += 1
-
-        if base_func:
-            try:
-                base_index = results['functions'][f]['ifuncs'].index(base_func)
-            except ValueError:
-                sys.stderr.write('Invalid -b "%s" parameter. Options: %s.\n' %
-                                 (base_func, ', '.join(results['functions'][f]['ifuncs'])))
-                sys.exit(os.EX_DATAERR)
-
-        if not no_header:
-            print('Function: %s' % f)
-            print('Variant: %s' % v)
-            print("%36s%s" % (' ', '\t'.join(ifuncs)))
-            print("=" * 120)
-
-        graph_res = {}
-        for res in results['functions'][f]['results']:
-            try:
-                attr_list = ['%s=%s' % (a, res[a]) for a in attrs]
-            except KeyError as ke:
-                sys.stderr.write('Invalid -a %s parameter. Options: %s.\n'
-                                 % (ke, ', '.join([a for a in res.keys() if a != 'timings'])))
-                sys.exit(os.EX_DATAERR)
-            i = 0
-            key = ', '.join(attr_list)
-            sys.stdout.write('%36s: ' % key)
-            graph_res[key] = res['timings']
-            for t in res['timings']:
-                if selected[i]:
-                    sys.stdout.write ('%12.2f' % t)
-                    if not no_diff:
-                        if i != base_index:
-                            base = res['timings'][base_index]
-                            diff = (base - t) * 100 / base
-                            sys.stdout.write (' (%6.2f%%)' % diff)
-                    sys.stdout.write('\t')
-                i = i + 1
-            print('')
+            out = []
+            if not no_header:
+                out.append('Function: %s\n' % f)
+                out.append('Variant: %s\n' % v)
+                out.append("%36s%s\n" % (' ', '\t'.join(ifuncs)))
+                out.append("=" * 120 + '\n')
+            cells = []
+            for n in range(len(indices)):
+                if is_base[n] or no_diff:
+                    cells.append(('%12.2f\t', [t[:, n]]))
+                else:
+                    cells.append(('%12.2f (%6.2f%%)\t', [t[:, n], diff[:, n]]))
+            out.extend(format_rows(keys, cells))
+            sys.stdout.write(''.join(out))
 
         if graph:
-            draw_graph(f, v, results['functions'][f]['ifuncs'], graph_res)
+            draw_graph(f, v, all_ifuncs, dict(zip(keys, timings.tolist())))
 
 
 def main(args):
@@ -180,7 +512,17 @@ def main(args):
         funcs = None
 
     results = parse_file(args.input, args.schema)
-    process_results(results, attrs, funcs, base_func, args.graph, args.no_diff, args.no_header)
+    if args.compare:
+        results2 = parse_file(args.compare, args.schema)
+        compare_results(results, results2, attrs, funcs, args.threshold,
+                        args.no_diff, args.no_header, args.format)
+        return os.EX_OK
+    if args.summary:
+        print_summary(results, funcs, base_func, args.size_attr,
+                      args.no_header, args.format)
+        return os.EX_OK
+    process_results(results, attrs, funcs, base_func, args.graph, args.no_diff,
+                    args.no_header, args.format)
     return os.EX_OK
 
 
@@ -207,6 +549,16 @@ if __name__ == '__main__':
                         help='Do not print the difference from baseline.')
     parser.add_argument('--no-header', action='store_true',
                         help='Do not print the header.')
+    parser.add_argument('--format', default='text', choices=export.FORMATS,
+                        help='Output format (default: %(default)s).')
+    parser.add_argument('--summary', action='store_true',
+                        help='Print the geometric mean speedups and the fastest ifunc per range of sizes.')
+    parser.add_argument('--size-attr', default='length',
+                        help='Attribute to group the results by with --summary (default: %(default)s).')
+    parser.add_argument('-c', '--compare',
+                        help='Result file of another run to compare the input file with.')
+    parser.add_argument('--threshold', default=10.0, type=float,
+                        help='Flag the differences beyond this percentage with --compare (default: %(default)s).')
 
     args = parser.parse_args()
     sys.exit(main(args))
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Move detailed timings into a binary timings file
+
+Given a benchmark output file with detailed timings, write a copy of it
+without the timings and a binary timings file with the timings next to
+the copy.  See import_bench.py for the format of the binary timings file.
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import sys
+import import_bench as bench
+
+
+def main(args):
+    """Program Entry Point
+
+    Args:
+        args: The parsed command line arguments
+    Return:
+        The exit code.
+    """
+    with open(args.input, 'r') as benchfile:
+        data = json.load(benchfile)
+    bench.validate(data, args.schema)
+
+    count = 0
+    with open(args.output + bench.TIMINGS_SUFFIX, 'wb') as timingsfile:
+        for func, variants in data['functions'].items():
+            for var, stats in variants.items():
+                if 'timings' not in stats:
+                    continue
+                bench.write_timings(timingsfile, func, var,
+                                    stats.pop('timings'))
+                count += 1
+
+    with open(args.output, 'w') as outfile:
+        json.dump(data, outfile, indent=2)
+        outfile.write('\n')
+
+    print('Wrote timings of %d variants to %s%s' % (count, args.output,
+                                                    bench.TIMINGS_SUFFIX))
+    return os.EX_OK
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move the detailed timings of a benchmark output file into a binary timings file.')
+    parser.add_argument('input', help='Benchmark output file with detailed timings')
+    parser.add_argument('output', help='Benchmark output file to write without the timings')
+    parser.add_argument('--schema',
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'benchout.schema.json'),
+                        help='JSON file to validate the input file (default: %(default)s)')
+
+    sys.exit(main(parser.parse_args()))
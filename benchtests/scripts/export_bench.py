@@ -0,0 +1,72 @@
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Functions to export benchmark comparison results
+
+The comparison scripts describe each comparison as a dictionary with at
+least the keys in FIELDS:
+
+    function: The function name
+    variant: The function variant name
+    stat: The statistic that was compared
+    before: The value from the first run or the baseline
+    after: The value from the second run
+    delta: The relative change from before to after in percent
+    verdict: One of 'improvement', 'regression' or 'same', or a script
+    specific verdict
+
+The records are written out as JSON lines, with all keys of the record, or
+as CSV, with only the requested fields.  The output is formatted in memory
+and written with a single call.
+"""
+
+import csv
+import json
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+FIELDS = ['function', 'variant', 'stat', 'before', 'after', 'delta',
+          'verdict']
+
+# Output formats understood by the comparison scripts.  The text format is
+# rendered by the scripts themselves.
+FORMATS = ['text', 'json', 'csv']
+
+
+def write_records(out, fmt, records, fields=FIELDS, header=True):
+    """Write comparison records
+
+    Args:
+        out: The file to write to
+        fmt: The output format, 'json' or 'csv'
+        records: List of record dictionaries
+        fields: The fields written in CSV format, in order
+        header: Whether to write the CSV header line
+    """
+    if fmt == 'json':
+        text = ''.join([json.dumps(r, sort_keys=True) + '\n'
+                        for r in records])
+    else:
+        buf = StringIO()
+        writer = csv.DictWriter(buf, fields, extrasaction='ignore',
+                                lineterminator='\n')
+        if header:
+            writer.writeheader()
+        writer.writerows(records)
+        text = buf.getvalue()
+    out.write(text)
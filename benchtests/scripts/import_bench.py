@@ -18,12 +18,94 @@
 """Functions to import benchmark data and process it"""
 
 import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from json.decoder import scanstring
 try:
     import jsonschema as validator
 except ImportError:
     print('Could not find jsonschema module.')
     raise
 
+# NumPy is optional.  When it is available, timings read in streaming mode
+# are handed out as NumPy arrays so that they can be sorted in place.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Size of the chunks read from the benchmark output file in streaming mode.
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Binary timings files hold the detailed timings of function variants in
+# records of the following form, in little-endian byte order:
+#
+#   magic         4 bytes, "BTIM"
+#   function      uint16, length of the function name
+#   variant       uint16, length of the variant name
+#   count         uint64, number of timings
+#   names         the function and variant names in UTF-8, padded with
+#                 zero bytes so that the timings are 8 byte aligned
+#   timings       count doubles, in ascending order
+#
+# Records are appended by each benchmark program, so a file may hold any
+# number of them.  Since the timings are stored sorted, they can be used
+# directly from a mapping of the file.  The timings of a benchmark output file FOO are looked
+# up in FOO.timings.
+TIMINGS_MAGIC = b'BTIM'
+TIMINGS_SUFFIX = '.timings'
+_TIMINGS_HEADER = struct.Struct('<4sHHQ')
+
+# The histogram of a function variant counts the measurements of the time
+# per call, each the mean of the iterations with one input, in logarithmic
+# buckets.  Workload variants have none.  Each power of two from 2^min-exp
+# on is split into 2^precision buckets of equal width, numbered from 0, and
+# only the numbers and counts of the non-empty buckets are stored.  These
+# are the percentiles add_percentiles computes from it, with the names of
+# the statistics they are stored as.
+PERCENTILES = [('p50', 50), ('p99', 99), ('p999', 99.9)]
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that cannot appear in a list of JSON numbers.  Anything else
+# that is not a number is rejected by float.
+_NOT_NUMBER_LIST = re.compile(r'[^-+.eE0-9, \t\n\r]')
+# The characters a number may continue with.  A number that is only
+# followed by these in the window may be cut off by the end of the chunk.
+_NUMBER_TAIL = re.compile(r'[-+.eE0-9]*\Z')
+
+try:
+    _STRING_TYPES = (str, unicode)
+    _NUMBER_TYPES = frozenset([int, long, float])
+    _INTEGER_TYPES = frozenset([int, long])
+except NameError:
+    _STRING_TYPES = (str,)
+    _NUMBER_TYPES = frozenset([int, float])
+    _INTEGER_TYPES = frozenset([int])
+
+# Checks for the types of JSON values.  Booleans are not numbers.
+_TYPE_CHECKS = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, _STRING_TYPES),
+    'number': lambda v: type(v) in _NUMBER_TYPES,
+    'integer': lambda v: type(v) in _INTEGER_TYPES,
+    'boolean': lambda v: type(v) is bool,
+    'null': lambda v: v is None
+}
+
+# Schema keywords understood by _compile_schema.
+_SCHEMA_KEYWORDS = frozenset(['title', 'description', 'type', 'properties',
+                              'patternProperties', 'additionalProperties',
+                              'required', 'minProperties', 'items'])
+
+# Validators for schema files, cached per process.
+_validators = {}
+
 
 def mean(lst):
     """Compute and return mean of numbers in a list
@@ -75,23 +157,112 @@ def split_list(bench, func, var):
     the maximum element, the maximum element in the group must be at most 4/3
     times the mean.
 
+    The groups are computed by group_means.
+
     Args:
         bench: The benchmark object
         func: The function name
         var: The function variant name
     """
+    timings = bench['functions'][func][var]['timings']
+    bench['functions'][func][var]['timings'] = group_means(timings)
+
+
+def group_means(lst):
+    """Compute the means of the groups of a sorted list of timings
+
+    Starting from the largest point, each group extends down to the
+    smallest point for which the mean of the group stays above 3/4 of its
+    largest member.  Since the list is sorted, the mean of a group can only
+    decrease as smaller points are added to it, so the start of each group
+    is found by scanning down from its largest member and the whole list is
+    processed in linear time.  The scan uses running sums (vectorized with
+    NumPy when it is available) and the result is then confirmed using the
+    mean of the group summed from its smallest member, so that the groups
+    and their means are exactly those of the straightforward quadratic
+    search.
+
+    Args:
+        lst: The list of timings, sorted in ascending order.
+    Return:
+        The list of group means in ascending order.
+    """
+    if numpy is not None and len(lst) > 0:
+        lst = numpy.asarray(lst, dtype=numpy.float64)
+        find_start = _group_start_vector
+        group_sum = lambda i, last: numpy.cumsum(lst[i:last + 1])[-1]
+    else:
+        find_start = _group_start
+        group_sum = lambda i, last: sum(lst[i:last + 1])
+
     means = []
-    lst = bench['functions'][func][var]['timings']
     last = len(lst) - 1
-    while lst:
-        for i in range(last + 1):
-            avg = mean(lst[i:])
-            if avg > 0.75 * lst[last]:
-                means.insert(0, avg)
-                lst = lst[:i]
-                last = i - 1
-                break
-    bench['functions'][func][var]['timings'] = means
+    while last >= 0:
+        limit = 0.75 * lst[last]
+        i = find_start(lst, last, limit)
+
+        # Running sums accumulate from the largest member and may round
+        # differently near the boundary, so settle the start of the group
+        # with means computed the same way as the mean we report.
+        while (i > 0
+               and group_sum(i - 1, last) / (last - i + 2) > limit):
+            i -= 1
+        while (i < last
+               and not group_sum(i, last) / (last - i + 1) > limit):
+            i += 1
+
+        means.append(float(group_sum(i, last) / (last - i + 1)))
+        last = i - 1
+
+    means.reverse()
+    return means
+
+
+def _group_start(lst, last, limit):
+    """Find the start of the group ending at LAST using running sums
+
+    Args:
+        lst: The sorted list of timings.
+        last: Index of the largest member of the group.
+        limit: The value the mean of the group must exceed.
+    Return:
+        Index of the smallest member of the group.
+    """
+    i = last
+    total = lst[last]
+    while i > 0:
+        total += lst[i - 1]
+        if not total / (last - i + 2) > limit:
+            break
+        i -= 1
+    return i
+
+
+def _group_start_vector(lst, last, limit):
+    """Find the start of the group ending at LAST with NumPy
+
+    Means of increasingly large windows below LAST are computed until one
+    of them drops to LIMIT.  Windows double in size, so the work is
+    proportional to the size of the group.
+
+    Args:
+        lst: The sorted NumPy array of timings.
+        last: Index of the largest member of the group.
+        limit: The value the mean of the group must exceed.
+    Return:
+        Index of the smallest member of the group.
+    """
+    width = 64
+    while True:
+        first = max(last + 1 - width, 0)
+        sums = numpy.cumsum(lst[last:(first - 1 if first else None):-1])
+        below = numpy.flatnonzero(sums / numpy.arange(1, len(sums) + 1)
+                                  <= limit)
+        if len(below) > 0:
+            return last + 1 - max(below[0], 1)
+        if first == 0:
+            return 0
+        width *= 2
 
 
 def do_for_all_timings(bench, callback):
@@ -121,21 +292,606 @@ def compress_timings(points):
     do_for_all_timings(points, split_list)
 
 
-def parse_bench(filename, schema_filename):
+def histogram_buckets(hist):
+    """Get the bounds and counts of the buckets of a histogram
+
+    Args:
+        hist: The histogram of a function variant
+    Return:
+        The list of (low, high, count) tuples of the non-empty buckets in
+        ascending order, where LOW and HIGH are the bounds of the time per
+        call of the bucket.
+    """
+    precision = hist['precision']
+    buckets = []
+    for idx, count in zip(hist['buckets'], hist['counts']):
+        exp = (idx >> precision) + hist['min-exp'] - precision
+        low = math.ldexp((1 << precision) + (idx & ((1 << precision) - 1)),
+                         exp)
+        buckets.append((low, low + math.ldexp(1, exp), count))
+    return buckets
+
+
+def histogram_percentile(hist, pct):
+    """Estimate a percentile of the time per call from a histogram
+
+    The measurements in a bucket are assumed to be spread evenly over it.
+
+    Args:
+        hist: The histogram of a function variant
+        pct: The percentile, between 0 and 100
+    Return:
+        The estimate, or None if the histogram is empty.
+    """
+    buckets = histogram_buckets(hist)
+    target = sum(b[2] for b in buckets) * pct / 100.0
+    seen = 0
+    for low, high, count in buckets:
+        if seen + count >= target:
+            return low + (high - low) * (target - seen) / count
+        seen += count
+    return None
+
+
+def variant_stats(stats, variant):
+    """Get the statistics to compare for a function variant
+
+    Variants that were run on several threads only have throughput
+    statistics, so their reciprocal throughput is compared along with those
+    of STATS that they have.
+
+    Args:
+        stats: List of the names of the statistics to compare
+        variant: The function variant
+    Return:
+        The list of the names of the statistics.
+    """
+    if 'threads' not in variant:
+        return stats
+    return ['reciprocal-throughput'] + [s for s in stats if s in variant
+                                        and s != 'reciprocal-throughput']
+
+
+def thread_mismatch(tl1, tl2):
+    """Check whether two runs of a function variant used different threads
+
+    Args:
+        tl1: The function variant from the first run
+        tl2: The function variant from the second run
+    Return:
+        A comparison record with the verdict 'mismatch' and the numbers of
+        threads, or None if the runs used the same number of threads.
+    """
+    threads1 = tl1.get('threads', 1)
+    threads2 = tl2.get('threads', 1)
+    if threads1 == threads2:
+        return None
+    return {'stat': 'threads', 'before': threads1, 'after': threads2,
+            'delta': None, 'verdict': 'mismatch'}
+
+
+def add_percentiles(bench):
+    """Add the PERCENTILES of each function variant with a histogram
+
+    Args:
+        bench: The parsed benchmark output
+    """
+    for variants in bench['functions'].values():
+        for stats in variants.values():
+            if 'histogram' not in stats:
+                continue
+            for name, pct in PERCENTILES:
+                val = histogram_percentile(stats['histogram'], pct)
+                if val is not None:
+                    stats[name] = val
+
+
+class _UnsupportedSchema(Exception):
+    """The schema uses keywords that _compile_schema does not handle"""
+
+
+def _compile_schema(schema):
+    """Compile a schema into a check function
+
+    Only the subset of JSON schema that the benchmark output schemas use is
+    supported.  The check function returns False for any value that does
+    not validate, and may also return False for some unusual values that
+    do, so a value that fails the check must be validated again with
+    jsonschema.
+
+    Args:
+        schema: The schema object.
+    Return:
+        The check function.
+    Exceptions:
+        _UnsupportedSchema if the schema uses other keywords.
+    """
+    if not isinstance(schema, dict) or set(schema) - _SCHEMA_KEYWORDS:
+        raise _UnsupportedSchema
+    checks = []
+
+    if 'type' in schema:
+        if schema['type'] not in _TYPE_CHECKS:
+            raise _UnsupportedSchema
+        checks.append(_TYPE_CHECKS[schema['type']])
+
+    if set(schema) & set(['properties', 'patternProperties',
+                          'additionalProperties', 'required',
+                          'minProperties']):
+        checks.append(_compile_object(schema))
+
+    if 'items' in schema:
+        items = schema['items']
+        if items == {'type': 'number'}:
+            # Arrays of timings can be huge, so check them at C speed.
+            check_item = None
+        else:
+            check_item = _compile_schema(items)
+
+        def check_array(v):
+            if not isinstance(v, list):
+                return True
+            if check_item is None:
+                return _NUMBER_TYPES.issuperset(set(map(type, v)))
+            return all(check_item(x) for x in v)
+        checks.append(check_array)
+
+    if len(checks) == 1:
+        return checks[0]
+    return lambda v: all(check(v) for check in checks)
+
+
+def _compile_object(schema):
+    """Compile the object keywords of a schema into a check function
+
+    Args:
+        schema: The schema object.
+    Return:
+        The check function.
+    """
+    props = dict((k, _compile_schema(v))
+                 for k, v in schema.get('properties', {}).items())
+    patterns = [(re.compile(k), _compile_schema(v))
+                for k, v in schema.get('patternProperties', {}).items()]
+    additional = schema.get('additionalProperties', True)
+    if not isinstance(additional, bool):
+        additional = _compile_schema(additional)
+    required = schema.get('required', [])
+    min_props = schema.get('minProperties', 0)
+
+    def check_object(v):
+        if not isinstance(v, dict):
+            return True
+        if len(v) < min_props:
+            return False
+        for key in required:
+            if key not in v:
+                return False
+        for key, val in v.items():
+            check = props.get(key)
+            matched = check is not None
+            if matched and not check(val):
+                return False
+            for regex, check in patterns:
+                if regex.search(key):
+                    matched = True
+                    if not check(val):
+                        return False
+            if not matched and additional is not True:
+                if additional is False or not additional(val):
+                    return False
+        return True
+
+    return check_object
+
+
+def get_validator(schema_filename):
+    """Get the validator for a schema file
+
+    The schema is loaded, checked and compiled once per process.
+
+    Args:
+        schema_filename: Name of the schema file.
+    Return:
+        A tuple of the compiled check function, which is None if the schema
+        could not be compiled, and the jsonschema validator object.
+    Exceptions:
+        validator.SchemaError if the schema is invalid.
+    """
+    key = os.path.realpath(schema_filename)
+    if key not in _validators:
+        with open(schema_filename, 'r') as schemafile:
+            schema = json.load(schemafile)
+        cls = validator.validators.validator_for(schema)
+        cls.check_schema(schema)
+        try:
+            check = _compile_schema(schema)
+        except _UnsupportedSchema:
+            check = None
+        _validators[key] = (check, cls(schema))
+    return _validators[key]
+
+
+def validate(obj, schema_filename):
+    """Validate an object against a schema file
+
+    Use the compiled check of the schema and only fall back to jsonschema,
+    which is much slower but gives a detailed error, if the check fails.
+
+    Args:
+        obj: The object to validate.
+        schema_filename: Name of the schema file.
+    Exceptions:
+        validator.ValidationError if the object is invalid.
+    """
+    check, full = get_validator(schema_filename)
+    if check is None or not check(obj):
+        full.validate(obj)
+
+
+class _StreamReader(object):
+    """Incremental reader for a JSON benchmark output file
+
+    The reader keeps only a window of the file in memory and exposes just
+    enough of a JSON tokenizer to walk the benchmark output structure.
+    Values that are not arrays of timings are small and are decoded with
+    the standard json decoder once they are entirely in the window.
+    """
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Drop consumed input and read the next chunk.
+
+        Return:
+            False if the end of the file has been reached, True otherwise.
+        """
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def error(self, msg):
+        """Raise a ValueError pointing at the current position"""
+        raise ValueError('%s: %s' % (self.f.name, msg))
+
+    def peek(self):
+        """Skip whitespace and return the next character or '' at EOF"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        """Consume CHAR, which must be the next token"""
+        if self.peek() != char:
+            self.error('expected \'%s\'' % char)
+        self.pos += 1
+
+    def next_member(self, close):
+        """Consume the separator after an object member or array element
+
+        Return:
+            True if another member follows, False if CLOSE ended the
+            container.
+        """
+        char = self.peek()
+        self.pos += 1
+        if char == ',':
+            return True
+        if char != close:
+            self.error('expected \',\' or \'%s\'' % close)
+        return False
+
+    def begin(self, open_char, close):
+        """Consume the start of a container
+
+        Return:
+            True if the container has members, False if it is empty.
+        """
+        self.expect(open_char)
+        if self.peek() == close:
+            self.pos += 1
+            return False
+        return True
+
+    def key(self):
+        """Read an object member name and the colon that follows it"""
+        if self.peek() != '"':
+            self.error('expected a member name')
+        while True:
+            try:
+                name, self.pos = scanstring(self.buf, self.pos + 1)
+                break
+            except ValueError:
+                if not self.fill():
+                    raise
+        self.expect(':')
+        return name
+
+    def value(self):
+        """Decode a complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the window may continue in the next
+            # chunk, even if raw_decode stopped before a trailing '.' or
+            # exponent.
+            if (_NUMBER_TAIL.match(self.buf, end)
+                and self.buf[self.pos] in '-0123456789' and self.fill()):
+                continue
+            self.pos = end
+            return val
+
+    def timings(self):
+        """Read an array of numbers into a compact array of doubles"""
+        out = array('d')
+        if self.peek() != '[':
+            self.error('timings must be an array')
+        self.pos += 1
+        if self.peek() == ']':
+            self.pos += 1
+            return out
+        while True:
+            end = self.buf.find(']', self.pos)
+            if end >= 0:
+                self._extend(out, self.buf[self.pos:end])
+                self.pos = end + 1
+                return out
+            # Convert all complete elements in the window.
+            cut = self.buf.rfind(',', self.pos)
+            if cut >= 0:
+                self._extend(out, self.buf[self.pos:cut])
+                self.pos = cut + 1
+            if not self.fill():
+                self.error('unterminated timings array')
+
+    def _extend(self, out, text):
+        """Append the comma separated numbers in TEXT to OUT"""
+        try:
+            if _NOT_NUMBER_LIST.search(text):
+                raise ValueError
+            out.extend(map(float, text.split(',')))
+        except ValueError:
+            raise validator.ValidationError(
+                    'timings must be an array of numbers')
+
+
+def _sort_timings(timings):
+    """Return TIMINGS sorted, as a NumPy array if NumPy is available"""
+    if numpy is not None:
+        timings = numpy.frombuffer(timings, dtype=numpy.float64)
+        timings.sort()
+        return timings
+    return array('d', sorted(timings))
+
+
+def _stream_bench(benchfile, schema_filename, chunk_size=STREAM_CHUNK_SIZE):
+    """Parse and validate a benchmark output file incrementally
+
+    Walk the functions -> variant -> timings hierarchy of the file without
+    building the complete object first.  Each variant is validated against
+    the schema as soon as it has been read, with its timings replaced by an
+    empty list, since the reader guarantees that they are numbers.  The
+    top level object is validated last with empty functions.
+
+    Args:
+        benchfile: The open benchmark output file.
+        schema_filename: Name of the schema file.
+        chunk_size: Size of the chunks the file is read in.
+    Return:
+        The bench dictionary, with timings stored as sorted arrays of
+        doubles.
+    """
+    reader = _StreamReader(benchfile, chunk_size)
+    bench = {}
+    functions = None
+
+    if reader.begin('{', '}'):
+        while True:
+            key = reader.key()
+            if key != 'functions':
+                bench[key] = reader.value()
+            else:
+                functions = bench.setdefault('functions', {})
+                if reader.begin('{', '}'):
+                    while True:
+                        func = reader.key()
+                        variants = functions.setdefault(func, {})
+                        if reader.begin('{', '}'):
+                            while True:
+                                var = reader.key()
+                                variants[var] = _stream_variant(
+                                        reader, schema_filename, func, var)
+                                if not reader.next_member('}'):
+                                    break
+                        if not reader.next_member('}'):
+                            break
+            if not reader.next_member('}'):
+                break
+
+    if reader.peek():
+        reader.error('extra data after the benchmark object')
+
+    # Validate everything except the contents of the functions.
+    top = dict(bench)
+    if functions is not None:
+        top['functions'] = dict((f, {}) for f in functions)
+    validate(top, schema_filename)
+    return bench
+
+
+def _stream_variant(reader, schema_filename, func, var):
+    """Read and validate a single function variant
+
+    Args:
+        reader: The _StreamReader positioned at the variant object.
+        schema_filename: Name of the schema file.
+        func: The function name
+        var: The function variant name
+    Return:
+        The variant dictionary.
+    """
+    variant = {}
+    timings = None
+    if reader.begin('{', '}'):
+        while True:
+            key = reader.key()
+            if key == 'timings' and reader.peek() == '[':
+                timings = reader.timings()
+                variant[key] = []
+            else:
+                variant[key] = reader.value()
+            if not reader.next_member('}'):
+                break
+
+    validate({'timing_type': '', 'functions': {func: {var: variant}}},
+             schema_filename)
+    if timings is not None:
+        variant['timings'] = _sort_timings(timings)
+    return variant
+
+
+def read_timings(filename):
+    """Map a binary timings file
+
+    The file is mapped into memory and the timings are returned as views of
+    the mapping where possible, i.e. as NumPy arrays if NumPy is available
+    and as memoryviews of doubles otherwise on little-endian hosts, so they
+    are only read from the file as they are used.
+
+    Args:
+        filename: Name of the binary timings file.
+    Return:
+        A list of tuples of function name, variant name and timings, in the
+        order of the file.
+    Exceptions:
+        ValueError if the file is not a valid binary timings file.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    records = []
+    pos = 0
+    while pos < len(data):
+        if pos + _TIMINGS_HEADER.size > len(data):
+            raise ValueError('%s: truncated record header' % filename)
+        magic, flen, vlen, count = _TIMINGS_HEADER.unpack_from(data, pos)
+        if magic != TIMINGS_MAGIC:
+            raise ValueError('%s: bad record magic at offset %d'
+                             % (filename, pos))
+        pos += _TIMINGS_HEADER.size
+        func = data[pos:pos + flen].decode('utf-8')
+        var = data[pos + flen:pos + flen + vlen].decode('utf-8')
+        pos += (flen + vlen + 7) & ~7
+        end = pos + count * 8
+        if end > len(data):
+            raise ValueError('%s: truncated timings of %s(%s)'
+                             % (filename, func, var))
+        if numpy is not None:
+            timings = numpy.frombuffer(data, dtype='<f8', count=count,
+                                       offset=pos)
+        elif sys.byteorder == 'little' and hasattr(memoryview, 'cast'):
+            timings = memoryview(data)[pos:end].cast('d')
+        else:
+            timings = array('d', data[pos:end])
+            if sys.byteorder != 'little':
+                timings.byteswap()
+        records.append((func, var, timings))
+        pos = end
+    return records
+
+
+def write_timings(f, func, var, timings):
+    """Append the timings of a function variant to a binary timings file
+
+    Args:
+        f: The binary timings file, open for writing in binary mode.
+        func: The function name
+        var: The function variant name
+        timings: The sequence of timings, in any order
+    """
+    fname = func.encode('utf-8')
+    vname = var.encode('utf-8')
+    if numpy is not None:
+        data = numpy.sort(numpy.asarray(timings, dtype='<f8')).tobytes()
+    else:
+        data = array('d', sorted(timings))
+        if sys.byteorder != 'little':
+            data.byteswap()
+        data = data.tostring() if sys.version_info[0] < 3 else data.tobytes()
+    pad = -(len(fname) + len(vname)) % 8
+    f.write(_TIMINGS_HEADER.pack(TIMINGS_MAGIC, len(fname), len(vname),
+                                 len(data) // 8))
+    f.write(fname + vname + b'\0' * pad)
+    f.write(data)
+
+
+def _attach_timings(bench, filename):
+    """Add the timings from a binary timings file to a benchmark
+
+    Timings are only added to variants that exist in the benchmark and do
+    not have timings already.  They are already sorted, so the views of
+    the mapping read_timings returns are used without copying them.
+
+    Args:
+        bench: The bench dictionary.
+        filename: Name of the binary timings file.
+    """
+    functions = bench['functions']
+    for func, var, timings in read_timings(filename):
+        variant = functions.get(func, {}).get(var)
+        if variant is None or 'timings' in variant:
+            continue
+        variant['timings'] = timings
+
+
+def parse_bench(filename, schema_filename, stream=False):
     """Parse the input file
 
     Parse and validate the json file containing the benchmark outputs.  Return
-    the resulting object.
+    the resulting object.  In streaming mode the file is read and validated
+    incrementally and the timings of each variant are stored as compact
+    arrays of doubles (NumPy arrays if NumPy is available) rather than lists,
+    which keeps memory usage low for detailed benchmark outputs.  Timings
+    from a binary timings file next to the benchmark output file (see
+    TIMINGS_SUFFIX) are added to the variants that have none.
     Args:
         filename: Name of the benchmark output file.
+        schema_filename: Name of the schema file.
+        stream: Parse the file incrementally.
     Return:
         The bench dictionary.
     """
-    with open(schema_filename, 'r') as schemafile:
-        schema = json.load(schemafile)
+    if stream:
+        with open(filename, 'r') as benchfile:
+            bench = _stream_bench(benchfile, schema_filename)
+    else:
         with open(filename, 'r') as benchfile:
             bench = json.load(benchfile)
-            validator.validate(bench, schema)
+            validate(bench, schema_filename)
             do_for_all_timings(bench, lambda b, f, v:
                     b['functions'][f][v]['timings'].sort())
-            return bench
+
+    if os.path.exists(filename + TIMINGS_SUFFIX):
+        _attach_timings(bench, filename + TIMINGS_SUFFIX)
+    return bench
@@ -0,0 +1,220 @@
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Generators of benchmark inputs
+
+Produce the inputs of a benchmark variant from a description of their
+distribution or from a recorded trace of arguments, for the generate and
+trace directives of bench.py input files.
+
+A distribution is described as a count followed by one distribution per
+input argument, separated by colons like the types in the args directive:
+
+  COUNT DIST[:DIST...]
+
+where each DIST is one or more alternatives separated by '|', each of them
+optionally preceded by a weight and '*':
+
+  uniform(LO, HI)      Uniformly distributed in [LO, HI].
+  loguniform(LO, HI)   Magnitude log-uniformly distributed in [LO, HI],
+                       LO and HI must be nonzero and have the same sign.
+  choice(V1, V2, ...)  One of the given C literals, e.g. NAN or -0.0.
+
+For example, to mostly draw inputs in [-1, 1] with some special values:
+
+  ## generate: 10000 0.99*uniform(-1, 1) | 0.01*choice(NAN, INFINITY, -0.0)
+
+Values of floating point arguments are written as exact hexadecimal
+literals, those of integer arguments are rounded down to integers.
+
+Only random.Random.random is used to draw values, whose sequence for a
+given seed is the same in all Python versions, so that the inputs only
+depend on the seed.
+"""
+
+import math
+import re
+import struct
+
+# Types of arguments with floating point values.  Arguments of other
+# types get integer values.
+FLOAT_TYPES = ['float', 'double', 'long double']
+
+_ALTERNATIVE = re.compile(r'^(?:([^*()]+)\*)?\s*(\w+)\s*\((.*)\)$')
+
+
+def _parse_number(text):
+    """Parse a number, which may be a hexadecimal float
+
+    Args:
+      text: The number
+    Return:
+      The value of the number.
+    """
+    text = text.strip()
+    if 'x' in text.lower():
+        if 'p' in text.lower():
+            return float.fromhex(text)
+        return int(text, 16)
+    return float(text)
+
+
+class _Alternative(object):
+    """One alternative of the distribution of an argument
+
+    Attributes:
+      weight: The relative weight of the alternative
+      kind: 'uniform', 'loguniform' or 'choice'
+      params: The bounds of the range or the list of literals
+    """
+    def __init__(self, text):
+        m = _ALTERNATIVE.match(text.strip())
+        if not m:
+            raise ValueError('Invalid distribution: %s' % text)
+        weight, self.kind, params = m.groups()
+        self.weight = float(weight) if weight is not None else 1.0
+        params = [p.strip() for p in params.split(',')]
+
+        if self.kind == 'choice':
+            if not all(params):
+                raise ValueError('Invalid choice: %s' % text)
+            self.params = params
+        elif self.kind in ('uniform', 'loguniform'):
+            if len(params) != 2:
+                raise ValueError('Expected two bounds: %s' % text)
+            lo, hi = [_parse_number(p) for p in params]
+            if lo > hi:
+                raise ValueError('Empty range: %s' % text)
+            if self.kind == 'loguniform':
+                if lo * hi <= 0:
+                    raise ValueError('Bounds of loguniform must be nonzero '
+                                     'and have the same sign: %s' % text)
+                self.sign = -1 if lo < 0 else 1
+                lo, hi = sorted([math.log(abs(lo)), math.log(abs(hi))])
+            self.params = (lo, hi)
+        else:
+            raise ValueError('Unknown distribution: %s' % self.kind)
+
+    def draw(self, rng, is_float):
+        """Draw a value
+
+        Args:
+          rng: The random.Random to draw with
+          is_float: Whether the argument has a floating point type
+        Return:
+          The value as a C literal.
+        """
+        r = rng.random()
+        if self.kind == 'choice':
+            return self.params[int(r * len(self.params))]
+
+        lo, hi = self.params
+        if self.kind == 'loguniform':
+            val = self.sign * math.exp(lo + (hi - lo) * r)
+        elif is_float:
+            val = lo + (hi - lo) * r
+        else:
+            # Include HI in the range of integers.
+            val = lo + (hi - lo + 1) * r
+        if is_float:
+            return val.hex()
+        return '%d' % math.floor(val)
+
+
+class _Distribution(object):
+    """The distribution of an argument
+
+    Attributes:
+      alternatives: The list of _Alternative objects
+      is_float: Whether the argument has a floating point type
+      fmt: The struct format to round values to, or None
+    """
+    def __init__(self, text, arg_type):
+        self.alternatives = [_Alternative(a) for a in text.split('|')]
+        self.total = sum(a.weight for a in self.alternatives)
+        if self.total <= 0:
+            raise ValueError('Invalid weights: %s' % text)
+        self.is_float = arg_type in FLOAT_TYPES
+        self.fmt = '<f' if arg_type == 'float' else None
+
+    def draw(self, rng):
+        """Draw a value as a C literal using the random.Random RNG"""
+        alt = self.alternatives[-1]
+        if len(self.alternatives) > 1:
+            r = rng.random() * self.total
+            for a in self.alternatives:
+                if r < a.weight:
+                    alt = a
+                    break
+                r -= a.weight
+
+        val = alt.draw(rng, self.is_float)
+        if self.fmt is not None and alt.kind != 'choice':
+            # Round to the precision of the argument so that the C literal
+            # is exact.
+            val = struct.unpack(self.fmt, struct.pack(
+                    self.fmt, float.fromhex(val)))[0].hex()
+        return val
+
+
+def generate(spec, arg_types, rng):
+    """Generate inputs from a distribution
+
+    Args:
+      spec: The description of the distribution, see above
+      arg_types: The types of the input arguments, without qualifiers
+      rng: The random.Random to draw values with
+    Return:
+      The list of inputs, each a comma separated list of C literals.
+    """
+    count, _, dists = spec.strip().partition(' ')
+    try:
+        count = int(count)
+    except ValueError:
+        raise ValueError('Invalid count: %s' % count)
+    dists = dists.split(':')
+    if len(dists) != len(arg_types):
+        raise ValueError('Expected %d distributions: %s'
+                         % (len(arg_types), spec))
+    dists = [_Distribution(d, t) for d, t in zip(dists, arg_types)]
+
+    try:
+        return [', '.join([d.draw(rng) for d in dists])
+                for i in range(count)]
+    except (OverflowError, struct.error):
+        raise ValueError('Value out of range of the argument type: %s'
+                         % spec)
+
+
+def read_trace(filename):
+    """Read a recorded trace of arguments
+
+    A trace has the format of the inputs in an input file, one line with
+    comma separated arguments per call.  Blank lines and comments starting
+    with '#' are skipped.
+
+    Args:
+      filename: Name of the trace file
+    Return:
+      The list of inputs.
+    """
+    inputs = []
+    with open(filename) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                inputs.append(line)
+    return inputs
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Measure the scaling of timing compression
+
+Time import_bench.group_means, with and without NumPy, on sorted random
+timings of increasing size.  The original quadratic grouping is timed as
+well for sizes where it finishes in reasonable time and its output is
+checked against that of group_means.
+"""
+
+from __future__ import print_function
+import argparse
+import random
+import sys
+import time
+import import_bench as bench
+
+
+def reference_means(lst):
+    """The original quadratic implementation of split_list
+
+    Args:
+        lst: The list of timings, sorted in ascending order.
+    Return:
+        The list of group means in ascending order.
+    """
+    means = []
+    last = len(lst) - 1
+    while lst:
+        for i in range(last + 1):
+            avg = bench.mean(lst[i:])
+            if avg > 0.75 * lst[last]:
+                means.insert(0, avg)
+                lst = lst[:i]
+                last = i - 1
+                break
+    return means
+
+
+def time_call(func, lst):
+    """Return the result of FUNC (LST) and the time it took in seconds"""
+    start = time.time()
+    res = func(lst)
+    return res, time.time() - start
+
+
+def main(args):
+    """Program Entry Point
+
+    Args:
+        args: The parsed command line arguments
+    """
+    rng = random.Random(args.seed)
+    numpy = bench.numpy
+
+    print('%10s %8s %12s %12s %12s' % ('timings', 'groups', 'reference',
+                                       'python', 'numpy'))
+    for size in args.sizes:
+        lst = sorted(rng.lognormvariate(5, 1) for i in range(size))
+
+        bench.numpy = None
+        means, t_python = time_call(bench.group_means, lst)
+        bench.numpy = numpy
+
+        if numpy is not None:
+            res, t_numpy = time_call(bench.group_means, lst)
+            if res != means:
+                print('NumPy result differs for %d timings' % size,
+                      file=sys.stderr)
+                return 1
+            t_numpy = '%12.3f' % t_numpy
+        else:
+            t_numpy = '%12s' % '-'
+
+        if size <= args.reference_max:
+            res, t_ref = time_call(reference_means, lst)
+            if res != means:
+                print('Result differs from reference for %d timings' % size,
+                      file=sys.stderr)
+                return 1
+            t_ref = '%12.3f' % t_ref
+        else:
+            t_ref = '%12s' % '-'
+
+        print('%10d %8d %s %12.3f %s' % (size, len(means), t_ref, t_python,
+                                         t_numpy))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the time taken to compress timings of different sizes.')
+
+    parser.add_argument('sizes', nargs='*', type=int,
+                        default=[100000, 1000000, 10000000],
+                        help='Numbers of timings to compress (default: %(default)s)')
+    parser.add_argument('--reference-max', default=2000, type=int,
+                        help='Largest size to run the original quadratic implementation on (default: %(default)s)')
+    parser.add_argument('--seed', default=0, type=int,
+                        help='Seed for the random timings (default: %(default)s)')
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Tests for compare_stats
+
+Check the Mann-Whitney U test against the normal approximation computed
+with exact integer arithmetic, and the comparison of runs on different
+numbers of threads.
+"""
+
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+try:
+    import numpy
+    import compare_stats
+except ImportError:
+    # The test is unsupported without the modules compare_stats needs.
+    sys.exit(77)
+
+
+def expected_p(groups1, groups2):
+    """Compute the p-value of two sets of timings given as lists of the
+    number of times each value occurs, in increasing order of the values"""
+    n1 = sum(groups1)
+    n2 = sum(groups2)
+    n = n1 + n2
+    rank = 0
+    rank_sum = 0.0
+    ties = 0
+    for c1, c2 in zip(groups1, groups2):
+        c = c1 + c2
+        rank_sum += c1 * (rank + (c + 1) / 2.0)
+        rank += c
+        ties += c ** 3 - c
+    u1 = rank_sum - n1 * (n1 + 1) / 2.0
+    var = n1 * n2 / 12.0 * ((n + 1) - ties / float(n * (n - 1)))
+    z = (abs(u1 - n1 * n2 / 2.0) - 0.5) / math.sqrt(var)
+    return math.erfc(z / math.sqrt(2))
+
+
+def timings(groups):
+    """Expand a list of the number of times each value occurs"""
+    return numpy.repeat(numpy.arange(len(groups), dtype=numpy.float64),
+                        groups)
+
+
+class MannWhitneyTest(unittest.TestCase):
+    def check(self, groups1, groups2):
+        u, p = compare_stats.mann_whitney(timings(groups1), timings(groups2))
+        self.assertAlmostEqual(p, expected_p(groups1, groups2), places=9)
+
+    def test_no_ties(self):
+        self.check([1] * 50 + [0] * 50, [0] * 40 + [1] * 60)
+
+    def test_ties(self):
+        self.check([10, 20, 30], [15, 25, 35])
+
+    def test_large_tie_group(self):
+        # The cube of the size of the first group does not fit in 64 bits.
+        self.check([1250000, 1000, 10], [1250000, 1100, 5])
+
+
+class CompareRunsTest(unittest.TestCase):
+    def run_variant(self, threads, cycles):
+        return {'functions': {'sin': {'': {
+            'threads': threads, 'duration': 1e9, 'iterations': 1e6,
+            'mean': 10.0 * threads, 'counters': {'cycles': cycles}}}}}
+
+    def test_thread_mismatch(self):
+        # Neither the timings nor the counters are compared.
+        records = compare_stats.compare_runs(self.run_variant(1, 100.0),
+                                             self.run_variant(4, 400.0),
+                                             1.0, 'mean', 0.05, 100, 1)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['verdict'], 'mismatch')
+        self.assertEqual((records[0]['before'], records[0]['after']), (1, 4))
+
+    def test_same_threads(self):
+        records = compare_stats.compare_runs(self.run_variant(4, 400.0),
+                                             self.run_variant(4, 500.0),
+                                             1.0, 'mean', 0.05, 100, 1)
+        self.assertEqual(sorted(r['stat'] for r in records),
+                         ['cycles', 'mean'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# Copyright (C) 2018 Free Software Foundation, Inc.
+# This file is part of the GNU C Library.
+#
+# The GNU C Library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# The GNU C Library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with the GNU C Library; if not, see
+# <http://www.gnu.org/licenses/>.
+"""Tests for import_bench
+
+Check that the streaming parser gives the same results as the plain JSON
+parser whatever the size of the chunks the file is read in.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+try:
+    import import_bench as bench
+except ImportError:
+    # The test is unsupported without the modules import_bench needs.
+    sys.exit(77)
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'benchout.schema.json')
+
+# Numbers in all the forms the benchmarks print them in, so that chunk
+# boundaries fall inside fractions and exponents.
+BENCH_OUT = '''{"timing_type": "hp_timing",
+ "functions": {
+  "sin": {
+   "": {"duration": 1234.5, "iterations": 1e+06, "max": 1.25E2,
+        "min": -0.5e-3, "mean": 12345678.125,
+        "timings": [27.214, 1e3, 19.943, 2.5E-1, 37, 0.0, 16.976]},
+   "workload-spec": {"duration": 9.87654321e+09, "iterations": 42,
+                     "reciprocal-throughput": 3.000001,
+                     "latency": 17.5}
+  },
+  "cos": {
+   "": {"duration": 1e9, "iterations": 1.5, "mean": 98765.4321,
+        "timings": [1234.5, 1.0e-2, 3]}
+  }
+ }
+}
+'''
+
+
+class StreamTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'bench.out')
+        with open(self.filename, 'w') as f:
+            f.write(BENCH_OUT)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_chunk_sizes(self, sizes):
+        expected = bench.parse_bench(self.filename, SCHEMA)
+        for size in sizes:
+            with open(self.filename, 'r') as f:
+                got = bench._stream_bench(f, SCHEMA, size)
+            bench.do_for_all_timings(got, lambda b, f, v:
+                    b['functions'][f][v].update(
+                        timings=list(b['functions'][f][v]['timings'])))
+            self.assertEqual(got, expected, 'chunk size %d' % size)
+
+    def test_small_chunks(self):
+        self.check_chunk_sizes(range(1, 65))
+
+    def test_default_chunk(self):
+        self.check_chunk_sizes([bench.STREAM_CHUNK_SIZE])
+
+    def test_number_at_chunk_end(self):
+        # The window ends right after '1234' and then after '1234.'.
+        with open(self.filename, 'w') as f:
+            json.dump({'a': 1234.5, 'b': 1e10}, f)
+        for size in range(1, 16):
+            with open(self.filename, 'r') as f:
+                reader = bench._StreamReader(f, size)
+                reader.begin('{', '}')
+                self.assertEqual(reader.key(), 'a')
+                self.assertEqual(reader.value(), 1234.5)
+                self.assertTrue(reader.next_member('}'))
+                self.assertEqual(reader.key(), 'b')
+                self.assertEqual(reader.value(), 1e10)
+                self.assertFalse(reader.next_member('}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,11 +18,24 @@
 """Benchmark output validator
 
 Given a benchmark output file in json format and a benchmark schema file,
-validate the output against the schema.
+validate the output against the schema:
+
+  validate_benchout.py <bench.out file> <bench.out schema>
+
+Many files can be validated in one go, in parallel:
+
+  validate_benchout.py [-s <schema>] [-j <jobs>] <file, directory or glob>...
+
+Directories are searched recursively for files matching --pattern.  The
+result for each file is printed, followed by a summary.
 """
 
 from __future__ import print_function
+import argparse
+import fnmatch
+import glob
 import json
+import multiprocessing
 import sys
 import os
 
@@ -49,6 +62,109 @@ def print_and_exit(message, exitcode):
     return exitcode
 
 
+def validate_file(job):
+    """Validate a single file in a worker process
+
+    Args:
+        job: A tuple of the file name, the schema file name and whether to
+        parse the file incrementally
+
+    Returns:
+        A tuple of the file name and an error message, which is None if the
+        file is valid.
+    """
+    filename, schema, stream = job
+    try:
+        bench.parse_bench(filename, schema, stream)
+    except IOError as e:
+        return filename, "IOError(%d): %s" % (e.errno, e.strerror)
+    except ValueError as e:
+        return filename, "Invalid benchmark output: %s" % e
+    except bench.validator.ValidationError as e:
+        return filename, "Invalid benchmark output: %s" % e.message
+    return filename, None
+
+
+def find_files(paths, pattern):
+    """Expand the paths given on the command line
+
+    Args:
+        paths: List of file names, directories and glob patterns
+        pattern: Pattern for the names of files to pick from directories
+
+    Returns:
+        The sorted list of files.
+    """
+    files = set()
+    for path in paths:
+        matches = glob.glob(path) or [path]
+        for match in matches:
+            if not os.path.isdir(match):
+                files.add(match)
+                continue
+            for root, dirs, names in os.walk(match):
+                files.update(os.path.join(root, n)
+                             for n in fnmatch.filter(names, pattern))
+    return sorted(files)
+
+
+def validate_many(args):
+    """Validate a number of files in a pool of worker processes
+
+    Args:
+        args: The command line arguments to the program
+
+    Returns:
+        0 if all files are valid or a non-zero failure code
+    """
+    parser = argparse.ArgumentParser(description='Validate benchmark output files.')
+    parser.add_argument('paths', nargs='+', help='Files, directories or glob patterns')
+    parser.add_argument('-s', '--schema',
+                        default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'benchout.schema.json'),
+                        help='Schema to validate the files against (default: %(default)s)')
+    parser.add_argument('-p', '--pattern', default='bench*.out',
+                        help='Names of the files to validate in directories (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', default=multiprocessing.cpu_count(), type=int,
+                        help='Number of worker processes (default: %(default)s)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Parse the files incrementally')
+    args = parser.parse_args(args)
+
+    # Check the schema once before starting the workers.
+    try:
+        bench.get_validator(args.schema)
+    except IOError as e:
+        return print_and_exit("IOError(%d): %s" % (e.errno, e.strerror),
+                os.EX_OSFILE)
+    except bench.validator.SchemaError as e:
+        return print_and_exit("Invalid schema: %s" % e.message, os.EX_DATAERR)
+
+    files = find_files(args.paths, args.pattern)
+    if not files:
+        return print_and_exit("No files to validate", os.EX_NOINPUT)
+
+    failed = 0
+    pool = multiprocessing.Pool(min(args.jobs, len(files)))
+    try:
+        jobs = [(f, args.schema, args.stream) for f in files]
+        for filename, error in pool.imap(validate_file, jobs):
+            if error:
+                failed += 1
+                print("FAIL: %s: %s" % (filename, error))
+            else:
+                print("PASS: %s" % filename)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    print("%d files validated: %d valid, %d invalid"
+          % (len(files), len(files) - failed, failed))
+    if failed:
+        return os.EX_DATAERR
+    return os.EX_OK
+
+
 def main(args):
     """Main entry point
 
@@ -61,9 +177,9 @@ def main(args):
     Exceptions:
         Exceptions thrown by validate_bench
     """
-    if len(args) != 2:
-        return print_and_exit("Usage: %s <bench.out file> <bench.out schema>"
-                % sys.argv[0], os.EX_USAGE)
+    if (len(args) != 2 or args[0].startswith('-')
+        or not args[1].endswith('.schema.json')):
+        return validate_many(args)
 
     try:
         bench.parse_bench(args[0], args[1])
@@ -27,20 +27,26 @@ directory, 'bot-cycle', to run a series of checkout and build steps,
 libraries required by the toolchain, 'compilers', to build
 cross-compilers for various configurations, or 'glibcs', to build
 glibc for various configurations and run the compilation parts of the
-testsuite.  Subsequent arguments name the versions of components to
-check out (<component>-<version), for 'checkout', or, for actions
-other than 'checkout' and 'bot-cycle', name configurations for which
-compilers or glibc are to be built.
+testsuite, or 'report-resources', to list the steps and configurations
+that took the most time in the builds so far.  Subsequent arguments name
+the versions of components to check out (<component>-<version), for
+'checkout', or, for actions other than 'checkout', 'bot-cycle' and
+'report-resources', name configurations for which compilers or glibc are
+to be built.
 
 """
 
 import argparse
+import concurrent.futures
 import datetime
 import email.mime.text
 import email.utils
+import hashlib
+import heapq
 import json
 import os
 import re
+import select
 import shutil
 import smtplib
 import stat
@@ -80,7 +86,7 @@ class Context(object):
     """The global state associated with builds in a given directory."""
 
     def __init__(self, topdir, parallelism, keep, replace_sources, strip,
-                 full_gcc, action):
+                 full_gcc, compilers_cache, incremental, ccache, action):
         """Initialize the context."""
         self.topdir = topdir
         self.parallelism = parallelism
@@ -88,30 +94,36 @@ class Context(object):
         self.replace_sources = replace_sources
         self.strip = strip
         self.full_gcc = full_gcc
+        self.compilers_cache = compilers_cache
+        self.incremental = incremental
+        self.ccache = ccache
+        self.glibc_configure_inputs = None
         self.srcdir = os.path.join(topdir, 'src')
         self.versions_json = os.path.join(self.srcdir, 'versions.json')
         self.build_state_json = os.path.join(topdir, 'build-state.json')
         self.bot_config_json = os.path.join(topdir, 'bot-config.json')
         self.installdir = os.path.join(topdir, 'install')
+        self.compilers_cache_dir = os.path.join(topdir, 'cache', 'compilers')
+        self.ccache_dir = os.path.join(topdir, 'cache', 'ccache')
         self.host_libraries_installdir = os.path.join(self.installdir,
                                                       'host-libraries')
         self.builddir = os.path.join(topdir, 'build')
         self.logsdir = os.path.join(topdir, 'logs')
         self.logsdir_old = os.path.join(topdir, 'logs-old')
-        self.makefile = os.path.join(self.builddir, 'Makefile')
         self.wrapper = os.path.join(self.builddir, 'wrapper')
         self.save_logs = os.path.join(self.builddir, 'save-logs')
         self.script_text = self.get_script_text()
-        if action != 'checkout':
+        if action not in ('checkout', 'report-resources'):
             self.build_triplet = self.get_build_triplet()
             self.glibc_version = self.get_glibc_version()
         self.configs = {}
         self.glibc_configs = {}
-        self.makefile_pieces = ['.PHONY: all\n']
+        self.cmdlists = []
         self.add_all_configs()
         self.load_versions_json()
         self.load_build_state_json()
         self.status_log_list = []
+        self.step_resources = {}
         self.email_warning = False
 
     def get_script_text(self):
@@ -463,9 +475,18 @@ class Context(object):
                 exit(1)
             self.bot()
             return
+        if action == 'report-resources':
+            if configs:
+                print('error: configurations specified for report-resources')
+                exit(1)
+            self.report_resources()
+            return
         if action == 'host-libraries' and configs:
             print('error: configurations specified for host-libraries')
             exit(1)
+        if self.ccache and shutil.which('ccache') is None:
+            print('error: ccache not found')
+            exit(1)
         self.clear_last_build_state(action)
         build_time = datetime.datetime.utcnow()
         if action == 'host-libraries':
@@ -486,7 +507,9 @@ class Context(object):
             old_versions = self.build_state['compilers']['build-versions']
             self.build_glibcs(configs)
         self.write_files()
-        self.do_build()
+        self.do_build(action)
+        if action == 'compilers' and self.compilers_cache:
+            self.prune_compilers_cache()
         if configs:
             # Partial build, do not update stored state.
             return
@@ -514,18 +537,13 @@ class Context(object):
         for dir in args:
             os.makedirs(dir, exist_ok=True)
 
-    def add_makefile_cmdlist(self, target, cmdlist, logsdir):
-        """Add makefile text for a list of commands."""
-        commands = cmdlist.makefile_commands(self.wrapper, logsdir)
-        self.makefile_pieces.append('all: %s\n.PHONY: %s\n%s:\n%s\n' %
-                                    (target, target, target, commands))
+    def add_cmdlist(self, cmdlist, logsdir):
+        """Add a list of commands to run."""
+        self.cmdlists.append((cmdlist, logsdir))
         self.status_log_list.extend(cmdlist.status_logs(logsdir))
 
     def write_files(self):
-        """Write out the Makefile and wrapper script."""
-        mftext = ''.join(self.makefile_pieces)
-        with open(self.makefile, 'w') as f:
-            f.write(mftext)
+        """Write out the wrapper scripts."""
         wrapper_text = (
             '#!/bin/sh\n'
             'prev_base=$1\n'
@@ -615,10 +633,18 @@ class Context(object):
             f.write(save_logs_text)
         os.chmod(self.save_logs, mode_exec)
 
-    def do_build(self):
+    def do_build(self, action):
         """Do the actual build."""
-        cmd = ['make', '-j%d' % self.parallelism]
-        subprocess.run(cmd, cwd=self.builddir, check=True)
+        # Order the commands by the average time they took in previous
+        # builds, if known.
+        totals = self.build_state[action]['resource-totals']
+        costs = {k: totals[k]['wall-time'] / totals[k]['runs']
+                 for k in totals}
+        scheduler = Scheduler(self.parallelism, self.wrapper, costs)
+        try:
+            scheduler.run(self.cmdlists)
+        finally:
+            self.step_resources = scheduler.resources
 
     def build_host_libraries(self):
         """Build the host libraries."""
@@ -634,7 +660,7 @@ class Context(object):
                                 ['--with-gmp=%s' % installdir,
                                 '--with-mpfr=%s' % installdir])
         cmdlist.add_command('done', ['touch', os.path.join(installdir, 'ok')])
-        self.add_makefile_cmdlist('host-libraries', cmdlist, logsdir)
+        self.add_cmdlist(cmdlist, logsdir)
 
     def build_host_library(self, cmdlist, lib, extra_opts=None):
         """Build one host library."""
@@ -665,16 +691,98 @@ class Context(object):
         for c in configs:
             self.configs[c].build()
 
+    def prune_compilers_cache(self):
+        """Remove the least recently used entries of the compilers cache
+        beyond its maximum size, and incomplete entries."""
+        if not os.access(self.compilers_cache_dir, os.F_OK):
+            return
+        entries = []
+        for f in os.listdir(self.compilers_cache_dir):
+            path = os.path.join(self.compilers_cache_dir, f)
+            if f.endswith('.tar.gz'):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+            else:
+                os.remove(path)
+        size = 0
+        for mtime, entry_size, path in sorted(entries, reverse=True):
+            size += entry_size
+            if size > self.compilers_cache * 1024 * 1024:
+                os.remove(path)
+
     def build_glibcs(self, configs):
         """Build the glibcs."""
         if not configs:
-            self.remove_dirs(os.path.join(self.builddir, 'glibcs'))
+            if not self.incremental:
+                self.remove_dirs(os.path.join(self.builddir, 'glibcs'))
             self.remove_dirs(os.path.join(self.installdir, 'glibcs'))
             self.remove_dirs(os.path.join(self.logsdir, 'glibcs'))
             configs = sorted(self.glibc_configs.keys())
         for c in configs:
             self.glibc_configs[c].build()
 
+    def ccache_env(self, arch, stats_log=None):
+        """Return the environment variables for ccache to use the cache of
+        an architecture, shared by all the configurations for it, and to
+        log the results of the compilations in STATS_LOG if not None."""
+        # The build directories differ between configurations, so they
+        # are not included in the hash of compilations with debug
+        # information.
+        env = {'CCACHE_DIR': os.path.join(self.ccache_dir, arch),
+               'CCACHE_MAXSIZE': '%dM' % self.ccache,
+               'CCACHE_BASEDIR': self.topdir,
+               'CCACHE_NOHASHDIR': '1'}
+        if stats_log is not None:
+            env['CCACHE_STATSLOG'] = stats_log
+        return env
+
+    @staticmethod
+    def read_ccache_stats(filename):
+        """Return the numbers of cache hits and misses in a ccache statistics
+        log."""
+        hits = 0
+        misses = 0
+        with open(filename, 'r') as f:
+            for l in f:
+                l = l.strip()
+                if l.endswith('cache_hit'):
+                    hits += 1
+                elif l == 'cache_miss':
+                    misses += 1
+        return {'hits': hits, 'misses': misses}
+
+    def glibc_configure_key(self, compiler, cfg_cmd):
+        """Return a hash of the inputs of a glibc configure command: the
+        command, the compiler and the files in the glibc sources read by
+        configure."""
+        if self.glibc_configure_inputs is None:
+            srcdir = self.component_srcdir('glibc')
+            names = {'configure', 'preconfigure', 'Implies', 'Implies-before',
+                     'Implies-after'}
+            files = [os.path.join(srcdir, f)
+                     for f in ('config.h.in', 'config.make.in', 'Makefile.in',
+                               'version.h', 'scripts/config.guess',
+                               'scripts/config.sub')]
+            for dirpath, dirnames, filenames in os.walk(srcdir):
+                dirnames[:] = sorted(d for d in dirnames if d != '.git')
+                files.extend(os.path.join(dirpath, f)
+                             for f in sorted(filenames) if f in names)
+            h = hashlib.sha256()
+            for f in files:
+                h.update(f.encode('utf-8') + b'\0')
+                with open(f, 'rb') as fp:
+                    h.update(fp.read())
+            self.glibc_configure_inputs = h.hexdigest()
+        # The compiler is identified by the time its build completed.
+        compiler_ok = os.path.join(compiler.installdir, 'ok')
+        try:
+            compiler_time = os.stat(compiler_ok).st_mtime
+        except FileNotFoundError:
+            compiler_time = None
+        key = [cfg_cmd, compiler.bindir, compiler_time,
+               self.glibc_configure_inputs]
+        return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
     def load_versions_json(self):
         """Load information about source directory versions."""
         if not os.access(self.versions_json, os.F_OK):
@@ -923,6 +1031,12 @@ class Context(object):
                 self.build_state[k]['result-changes'] = {}
             if 'ever-passed' not in self.build_state[k]:
                 self.build_state[k]['ever-passed'] = []
+            if 'ccache-stats' not in self.build_state[k]:
+                self.build_state[k]['ccache-stats'] = {}
+            if 'step-resources' not in self.build_state[k]:
+                self.build_state[k]['step-resources'] = {}
+            if 'resource-totals' not in self.build_state[k]:
+                self.build_state[k]['resource-totals'] = {}
 
     def store_build_state_json(self):
         """Store information about the state of previous builds."""
@@ -974,8 +1088,60 @@ class Context(object):
         new_passes = {t for t in build_results if build_results[t] == 'PASS'}
         self.build_state[action]['ever-passed'] = sorted(old_ever_passed |
                                                          new_passes)
+        ccache_stats = {}
+        if action == 'glibcs' and self.ccache:
+            for c in sorted(self.glibc_configs.keys()):
+                log = self.glibc_configs[c].ccache_stats_log()
+                if os.access(log, os.F_OK):
+                    ccache_stats[c] = self.read_ccache_stats(log)
+        self.build_state[action]['ccache-stats'] = ccache_stats
+        self.build_state[action]['step-resources'] = self.step_resources
+        totals = self.build_state[action]['resource-totals']
+        for step, res in self.step_resources.items():
+            if step not in totals:
+                totals[step] = {'runs': 0, 'wall-time': 0.0, 'cpu-time': 0.0,
+                                'max-rss': 0}
+            t = totals[step]
+            t['runs'] += 1
+            t['wall-time'] = round(t['wall-time'] + res['wall-time'], 2)
+            t['cpu-time'] = round(t['cpu-time'] + res['cpu-time'], 2)
+            t['max-rss'] = max(t['max-rss'], res['max-rss'])
         self.store_build_state_json()
 
+    def report_resources(self, count=20):
+        """Print the steps and configurations that took the most time on
+        average in the builds so far."""
+        for action in ('host-libraries', 'compilers', 'glibcs'):
+            totals = self.build_state[action]['resource-totals']
+            if not totals:
+                continue
+            steps = []
+            configs = {}
+            for step, t in totals.items():
+                wall = t['wall-time'] / t['runs']
+                cpu = t['cpu-time'] / t['runs']
+                steps.append((wall, cpu, t['max-rss'], t['runs'], step))
+                config = step.split()[0]
+                c = configs.setdefault(config, [0.0, 0.0, 0, 0])
+                c[0] += wall
+                c[1] += cpu
+                c[2] = max(c[2], t['max-rss'])
+                c[3] = max(c[3], t['runs'])
+            print('Slowest %s steps, average over runs:\n' % action)
+            print('%10s %10s %12s %5s  %s' % ('wall (s)', 'CPU (s)',
+                                             'max RSS (K)', 'runs', 'step'))
+            for r in sorted(steps, reverse=True)[:count]:
+                print('%10.1f %10.1f %12d %5d  %s' % r)
+            print('\nSlowest %s configurations, average over runs:\n'
+                  % action)
+            print('%10s %10s %12s %5s  %s' % ('wall (s)', 'CPU (s)',
+                                             'max RSS (K)', 'runs',
+                                             'configuration'))
+            for r in sorted([tuple(v) + (k,) for k, v in configs.items()],
+                            reverse=True)[:count]:
+                print('%10.1f %10.1f %12d %5d  %s' % r)
+            print()
+
     def load_bot_config_json(self):
         """Load bot configuration."""
         with open(self.bot_config_json, 'r') as f:
@@ -1105,6 +1271,21 @@ class Context(object):
                         changes_text)
         if not results_text:
             results_text = 'Clean build with unchanged results.\n\n'
+        ccache_stats = self.build_state[action]['ccache-stats']
+        if ccache_stats:
+            def hit_rate(name, hits, misses):
+                total = hits + misses
+                rate = 100.0 * hits / total if total else 0.0
+                return '%s: %.1f%% (%d of %d)' % (name, rate, hits, total)
+            all_hits = sum(v['hits'] for v in ccache_stats.values())
+            all_misses = sum(v['misses'] for v in ccache_stats.values())
+            ccache_list = [hit_rate(k, ccache_stats[k]['hits'],
+                                    ccache_stats[k]['misses'])
+                           for k in sorted(ccache_stats.keys())]
+            results_text += ('Compiler cache hit rates:\n\n%s\n\n%s\n\n' %
+                             (hit_rate('All configurations', all_hits,
+                                       all_misses),
+                              '\n'.join(ccache_list)))
         versions_list = sorted(versions.keys())
         versions_list = ['%s: %s (%s)' % (k, versions[k]['version'],
                                           versions[k]['revision'])
@@ -1127,6 +1308,12 @@ class Context(object):
                '-j%d' % self.parallelism]
         if self.full_gcc:
             cmd.append('--full-gcc')
+        if self.compilers_cache:
+            cmd.append('--compilers-cache=%d' % self.compilers_cache)
+        if self.incremental:
+            cmd.append('--incremental')
+        if self.ccache:
+            cmd.append('--ccache=%d' % self.ccache)
         cmd.extend(opts)
         cmd.extend([self.topdir, action])
         sys.stdout.flush()
@@ -1186,6 +1373,7 @@ class Config(object):
         self.sysroot = ctx.compiler_sysroot(self.name)
         self.builddir = os.path.join(ctx.builddir, 'compilers', self.name)
         self.logsdir = os.path.join(ctx.logsdir, 'compilers', self.name)
+        self.cache_key = None
 
     def component_builddir(self, component):
         """Return the directory to use for a (non-glibc) build."""
@@ -1201,32 +1389,104 @@ class Config(object):
                              os.path.join(self.ctx.host_libraries_installdir,
                                           'ok')])
         cmdlist.use_path(self.bindir)
-        self.build_cross_tool(cmdlist, 'binutils', 'binutils',
-                              ['--disable-gdb',
-                               '--disable-libdecnumber',
-                               '--disable-readline',
-                               '--disable-sim'])
+        host_versions = self.ctx.build_state['host-libraries']['build-versions']
+        self.cache_key = json.dumps([self.ctx.build_triplet, host_versions],
+                                    sort_keys=True)
+        # The kernel headers are installed with the host compiler, in
+        # parallel with the build of binutils.
+        cmdlist.push_branches()
+        self.build_cached(cmdlist, 'binutils', ['binutils'],
+                          self.build_cross_tool, cmdlist, 'binutils',
+                          'binutils', ['--disable-gdb',
+                                       '--disable-libdecnumber',
+                                       '--disable-readline',
+                                       '--disable-sim'])
         if self.os.startswith('linux'):
-            self.install_linux_headers(cmdlist)
-        self.build_gcc(cmdlist, True)
+            cmdlist.next_branch()
+            self.build_cached(cmdlist, 'linux', ['linux'],
+                              self.install_linux_headers, cmdlist)
+        cmdlist.pop_branches()
+        self.build_cached(cmdlist, 'gcc-first', ['gcc'], self.build_gcc,
+                          cmdlist, True)
         if self.os == 'gnu':
-            self.install_gnumach_headers(cmdlist)
-            self.build_cross_tool(cmdlist, 'mig', 'mig')
-            self.install_hurd_headers(cmdlist)
+            self.build_cached(cmdlist, 'gnumach', ['gnumach'],
+                              self.install_gnumach_headers, cmdlist)
+            self.build_cached(cmdlist, 'mig', ['mig'],
+                              self.build_cross_tool, cmdlist, 'mig', 'mig')
+            self.build_cached(cmdlist, 'hurd', ['hurd'],
+                              self.install_hurd_headers, cmdlist)
+        # The glibcs only depend on the bootstrap compiler, they are
+        # built in parallel and installed in the sysroot one at a time.
+        cmdlist.push_branches()
         for g in self.compiler_glibcs:
-            cmdlist.push_subdesc('glibc')
-            cmdlist.push_subdesc(g.name)
-            g.build_glibc(cmdlist, True)
-            cmdlist.pop_subdesc()
-            cmdlist.pop_subdesc()
-        self.build_gcc(cmdlist, False)
+            cmdlist.next_branch()
+            self.build_cached(cmdlist, 'glibc %s' % g.name, ['glibc'],
+                              self.build_compiler_glibc, cmdlist, g)
+        cmdlist.pop_branches()
+        self.build_cached(cmdlist, 'gcc', ['gcc'], self.build_gcc, cmdlist,
+                          False)
         cmdlist.add_command('done', ['touch',
                                      os.path.join(self.installdir, 'ok')])
-        self.ctx.add_makefile_cmdlist('compilers-%s' % self.name, cmdlist,
-                                      self.logsdir)
+        self.ctx.add_cmdlist(cmdlist, self.logsdir)
+
+    def build_cached(self, cmdlist, name, components, build, *args):
+        """Generate commands to build part of this compiler with BUILD,
+        called with ARGS, or to restore it from the compilers cache.  BUILD
+        takes a destdir keyword argument naming a staging directory to
+        install into instead of the installation directory.
+
+        The cache is keyed by the key of the parts of this compiler built
+        before, the versions of COMPONENTS and the commands of the
+        build."""
+        if not self.ctx.compilers_cache:
+            build(*args)
+            return
+        stagedir = os.path.join(self.builddir, 'stage', *name.split())
+        mark = cmdlist.mark()
+        build(*args, destdir=stagedir)
+        key = [self.cache_key, name]
+        for c in components:
+            v = self.ctx.versions.get(c, {})
+            key.append([c, v.get('version'), v.get('revision')])
+        for c in cmdlist.commands_since(mark):
+            key.append([c.desc, c.dir, c.path, c.command, c.always_run])
+        self.cache_key = hashlib.sha256(
+            json.dumps(key).encode('utf-8')).hexdigest()
+        entry = os.path.join(self.ctx.compilers_cache_dir,
+                             '%s.tar.gz' % self.cache_key)
+        restore_cmd = ['tar', '-C', self.installdir, '-xzf', entry]
+        if os.access(entry, os.F_OK):
+            # Mark the entry as recently used.
+            os.utime(entry)
+            cmdlist.truncate(mark)
+            cmdlist.push_subdesc(name)
+            cmdlist.add_command_dir('restore-cached', None, restore_cmd,
+                                    exclusive=self.installdir)
+            cmdlist.pop_subdesc()
+            return
+        cmdlist.push_subdesc(name)
+        cmdlist.add_command_dir('store-cached', None,
+                                ['sh', '-c',
+                                 'mkdir -p "$1" && tar -C "$2" -czf "$3.tmp" . '
+                                 '&& mv "$3.tmp" "$3"', 'store-cached',
+                                 self.ctx.compilers_cache_dir,
+                                 stagedir + self.installdir, entry])
+        cmdlist.add_command_dir('install-cached', None, restore_cmd,
+                                exclusive=self.installdir)
+        cmdlist.cleanup_dir('cleanup-stage', stagedir)
+        cmdlist.pop_subdesc()
 
-    def build_cross_tool(self, cmdlist, tool_src, tool_build, extra_opts=None):
-        """Build one cross tool."""
+    def build_compiler_glibc(self, cmdlist, glibc, destdir=None):
+        """Build one of the glibcs of this compiler."""
+        cmdlist.push_subdesc('glibc')
+        cmdlist.push_subdesc(glibc.name)
+        glibc.build_glibc(cmdlist, True, destdir)
+        cmdlist.pop_subdesc()
+        cmdlist.pop_subdesc()
+
+    def build_cross_tool(self, cmdlist, tool_src, tool_build, extra_opts=None,
+                         destdir=None):
+        """Build one cross tool, installing it under DESTDIR if not None."""
         srcdir = self.ctx.component_srcdir(tool_src)
         builddir = self.component_builddir(tool_build)
         cmdlist.push_subdesc(tool_build)
@@ -1251,12 +1511,15 @@ class Config(object):
         # of other toolchains being built) is not known to be
         # significantly beneficial, so it is simplest just to disable
         # parallel install for cross tools here.
-        cmdlist.add_command('install', ['make', '-j1', 'install'])
+        install_cmd = ['make', '-j1', 'install']
+        if destdir is not None:
+            install_cmd.append('DESTDIR=%s' % destdir)
+        cmdlist.add_command('install', install_cmd)
         cmdlist.cleanup_dir()
         cmdlist.pop_subdesc()
 
-    def install_linux_headers(self, cmdlist):
-        """Install Linux kernel headers."""
+    def install_linux_headers(self, cmdlist, destdir=None):
+        """Install Linux kernel headers, under DESTDIR if not None."""
         arch_map = {'aarch64': 'arm64',
                     'alpha': 'alpha',
                     'arm': 'arm',
@@ -1286,6 +1549,8 @@ class Config(object):
         srcdir = self.ctx.component_srcdir('linux')
         builddir = self.component_builddir('linux')
         headers_dir = os.path.join(self.sysroot, 'usr')
+        if destdir is not None:
+            headers_dir = destdir + headers_dir
         cmdlist.push_subdesc('linux')
         cmdlist.create_use_dir(builddir)
         cmdlist.add_command('install-headers',
@@ -1296,8 +1561,8 @@ class Config(object):
         cmdlist.cleanup_dir()
         cmdlist.pop_subdesc()
 
-    def install_gnumach_headers(self, cmdlist):
-        """Install GNU Mach headers."""
+    def install_gnumach_headers(self, cmdlist, destdir=None):
+        """Install GNU Mach headers, under DESTDIR if not None."""
         srcdir = self.ctx.component_srcdir('gnumach')
         builddir = self.component_builddir('gnumach')
         cmdlist.push_subdesc('gnumach')
@@ -1308,13 +1573,14 @@ class Config(object):
                              '--host=%s' % self.triplet,
                              '--prefix=',
                              'CC=%s-gcc -nostdlib' % self.triplet])
-        cmdlist.add_command('install', ['make', 'DESTDIR=%s' % self.sysroot,
+        cmdlist.add_command('install', ['make', 'DESTDIR=%s%s' %
+                                        (destdir or '', self.sysroot),
                                         'install-data'])
         cmdlist.cleanup_dir()
         cmdlist.pop_subdesc()
 
-    def install_hurd_headers(self, cmdlist):
-        """Install Hurd headers."""
+    def install_hurd_headers(self, cmdlist, destdir=None):
+        """Install Hurd headers, under DESTDIR if not None."""
         srcdir = self.ctx.component_srcdir('hurd')
         builddir = self.component_builddir('hurd')
         cmdlist.push_subdesc('hurd')
@@ -1326,13 +1592,14 @@ class Config(object):
                              '--prefix=',
                              '--disable-profile', '--without-parted',
                              'CC=%s-gcc -nostdlib' % self.triplet])
-        cmdlist.add_command('install', ['make', 'prefix=%s' % self.sysroot,
+        cmdlist.add_command('install', ['make', 'prefix=%s%s' %
+                                        (destdir or '', self.sysroot),
                                         'no_deps=t', 'install-headers'])
         cmdlist.cleanup_dir()
         cmdlist.pop_subdesc()
 
-    def build_gcc(self, cmdlist, bootstrap):
-        """Build GCC."""
+    def build_gcc(self, cmdlist, bootstrap, destdir=None):
+        """Build GCC, installing it under DESTDIR if not None."""
         # libssp is of little relevance with glibc's own stack
         # checking support.  libcilkrts does not support GNU/Hurd (and
         # has been removed in GCC 8, so --disable-libcilkrts can be
@@ -1376,7 +1643,7 @@ class Config(object):
             langs = 'all' if self.ctx.full_gcc else 'c,c++'
             cfg_opts += ['--enable-languages=%s' % langs,
                          '--enable-shared', '--enable-threads']
-        self.build_cross_tool(cmdlist, 'gcc', tool_build, cfg_opts)
+        self.build_cross_tool(cmdlist, 'gcc', tool_build, cfg_opts, destdir)
 
 
 class Glibc(object):
@@ -1412,27 +1679,39 @@ class Glibc(object):
         ctool = '%s-%s' % (self.compiler.triplet, tool)
         if self.ccopts and (tool == 'gcc' or tool == 'g++'):
             ctool = '%s %s' % (ctool, self.ccopts)
+        if self.ctx.ccache and (tool == 'gcc' or tool == 'g++'):
+            ctool = 'ccache %s' % ctool
         return ctool
 
+    def ccache_stats_log(self):
+        """Return the name of the ccache statistics log of this glibc."""
+        return os.path.join(self.ctx.logsdir, 'glibcs', self.name,
+                            'ccache-stats.txt')
+
     def build(self):
         """Generate commands to build this glibc."""
         builddir = self.ctx.component_builddir('glibcs', self.name, 'glibc')
         installdir = self.ctx.glibc_installdir(self.name)
         logsdir = os.path.join(self.ctx.logsdir, 'glibcs', self.name)
-        self.ctx.remove_recreate_dirs(installdir, builddir, logsdir)
+        if self.ctx.incremental:
+            self.ctx.remove_recreate_dirs(installdir, logsdir)
+        else:
+            self.ctx.remove_recreate_dirs(installdir, builddir, logsdir)
         cmdlist = CommandList('glibcs-%s' % self.name, self.ctx.keep)
         cmdlist.add_command('check-compilers',
                             ['test', '-f',
                              os.path.join(self.compiler.installdir, 'ok')])
         cmdlist.use_path(self.compiler.bindir)
         self.build_glibc(cmdlist, False)
-        self.ctx.add_makefile_cmdlist('glibcs-%s' % self.name, cmdlist,
-                                      logsdir)
+        self.ctx.add_cmdlist(cmdlist, logsdir)
 
-    def build_glibc(self, cmdlist, for_compiler):
+    def build_glibc(self, cmdlist, for_compiler, destdir=None):
         """Generate commands to build this glibc, either as part of a compiler
         build or with the bootstrapped compiler (and in the latter case, run
-        tests as well)."""
+        tests as well).  Install it under DESTDIR if not None.  In the
+        latter case, with incremental builds, the build directory is kept
+        and only configured again, from scratch, if the inputs of
+        configure changed."""
         srcdir = self.ctx.component_srcdir('glibc')
         if for_compiler:
             builddir = self.ctx.component_builddir('compilers',
@@ -1443,7 +1722,12 @@ class Glibc(object):
             builddir = self.ctx.component_builddir('glibcs', self.name,
                                                    'glibc')
             installdir = self.ctx.glibc_installdir(self.name)
-        cmdlist.create_use_dir(builddir)
+        if destdir is not None:
+            installdir = destdir + installdir
+        incremental = self.ctx.incremental and not for_compiler
+        if self.ctx.ccache:
+            stats_log = None if for_compiler else self.ccache_stats_log()
+            cmdlist.use_env(self.ctx.ccache_env(self.arch, stats_log))
         use_usr = self.os != 'gnu'
         prefix = '/usr' if use_usr else ''
         cfg_cmd = [os.path.join(srcdir, 'configure'),
@@ -1465,10 +1749,36 @@ class Glibc(object):
         if self.os == 'gnu':
             cfg_cmd += ['MIG=%s' % self.tool_name('mig')]
         cfg_cmd += self.cfg
-        cmdlist.add_command('configure', cfg_cmd)
+        if incremental:
+            key = self.ctx.glibc_configure_key(self.compiler, cfg_cmd)
+            key_file = os.path.join(builddir, 'configure-key.txt')
+            try:
+                with open(key_file, 'r') as f:
+                    old_key = f.read().strip()
+            except FileNotFoundError:
+                old_key = None
+            if (old_key == key and
+                os.access(os.path.join(builddir, 'config.status'), os.F_OK)):
+                cmdlist.use_dir(builddir)
+                # The summary of the tests of the previous build must not
+                # be saved as that of this one if this one fails.
+                cmdlist.add_command('remove-tests-sum',
+                                    ['rm', '-f', 'tests.sum'])
+                cmdlist.add_command('configure',
+                                    ['test', '-f', 'config.status'])
+            else:
+                cmdlist.create_use_dir(builddir)
+                cmdlist.add_command('configure', cfg_cmd)
+            cmdlist.add_command('configure-key',
+                                ['sh', '-c', 'echo "$1" > "$2"',
+                                 'configure-key', key, key_file])
+        else:
+            cmdlist.create_use_dir(builddir)
+            cmdlist.add_command('configure', cfg_cmd)
         cmdlist.add_command('build', ['make'])
         cmdlist.add_command('install', ['make', 'install',
-                                        'install_root=%s' % installdir])
+                                        'install_root=%s' % installdir],
+                            exclusive=installdir)
         # GCC uses paths such as lib/../lib64, so make sure lib
         # directories always exist.
         mkdir_cmd = ['mkdir', '-p',
@@ -1485,47 +1795,50 @@ class Glibc(object):
             cmdlist.add_command('check', ['make', 'check'])
             cmdlist.add_command('save-logs', [self.ctx.save_logs],
                                 always_run=True)
-        cmdlist.cleanup_dir()
+        cmdlist.use_env(None)
+        if incremental:
+            cmdlist.use_dir(None)
+        else:
+            cmdlist.cleanup_dir()
 
 
 class Command(object):
     """A command run in the build process."""
 
-    def __init__(self, desc, num, dir, path, command, always_run=False):
+    # Estimates of the time taken by the steps of a build, relative to
+    # other commands, to order the commands.
+    step_costs = {'build': 100, 'check': 50, 'configure': 10, 'install': 10}
+
+    def __init__(self, desc, num, dir, path, command, always_run=False,
+                 deps=None, exclusive=None, env=None):
         """Initialize a Command object."""
         self.dir = dir
         self.path = path
+        self.env = env
         self.desc = desc
         trans = str.maketrans({' ': '-'})
         self.logbase = '%03d-%s' % (num, desc.translate(trans))
         self.command = command
         self.always_run = always_run
-
-    @staticmethod
-    def shell_make_quote_string(s):
-        """Given a string not containing a newline, quote it for use by the
-        shell and make."""
-        assert '\n' not in s
-        if re.fullmatch('[]+,./0-9@A-Z_a-z-]+', s):
-            return s
-        strans = str.maketrans({"'": "'\\''"})
-        s = "'%s'" % s.translate(strans)
-        mtrans = str.maketrans({'$': '$$'})
-        return s.translate(mtrans)
-
-    @staticmethod
-    def shell_make_quote_list(l, translate_make):
-        """Given a list of strings not containing newlines, quote them for use
-        by the shell and make, returning a single string.  If translate_make
-        is true and the first string is 'make', change it to $(MAKE)."""
-        l = [Command.shell_make_quote_string(s) for s in l]
-        if translate_make and l[0] == 'make':
-            l[0] = '$(MAKE)'
-        return ' '.join(l)
-
-    def shell_make_quote(self):
-        """Return this command quoted for the shell and make."""
-        return self.shell_make_quote_list(self.command, True)
+        self.deps = deps or []
+        self.exclusive = exclusive
+        # The commands whose failure makes this command unresolved: the
+        # dependencies, looking through the always-run ones.
+        self.status_deps = []
+        for d in self.deps:
+            for sd in d.status_deps if d.always_run else [d]:
+                if sd not in self.status_deps:
+                    self.status_deps.append(sd)
+
+    def cost(self):
+        """Return an estimate of the time taken by this command."""
+        return self.step_costs.get(self.desc.split()[-1], 1)
+
+    def uses_make_jobs(self):
+        """Return whether this command is a make that may run jobs in
+        parallel."""
+        return (self.command[0] == 'make' and
+                not any(a.startswith('-j') for a in self.command[1:]))
 
 
 class CommandList(object):
@@ -1536,8 +1849,11 @@ class CommandList(object):
         self.cmdlist = []
         self.dir = None
         self.path = None
+        self.env = None
         self.desc = [desc]
         self.keep = keep
+        self.deps = []
+        self.branches = []
 
     def desc_txt(self, desc):
         """Return the description to use for a command."""
@@ -1552,6 +1868,11 @@ class CommandList(object):
         commands."""
         self.path = path
 
+    def use_env(self, env):
+        """Set a dictionary of environment variables for subsequent
+        commands, or None."""
+        self.env = env
+
     def push_subdesc(self, subdesc):
         """Set the default subdescription for subsequent commands (e.g., the
         name of a component being built, within the series of commands
@@ -1562,6 +1883,42 @@ class CommandList(object):
         """Pop a subdescription from the list of descriptions."""
         self.desc.pop()
 
+    def push_branches(self):
+        """Start sequences of commands that may run in parallel with each
+        other.  Each sequence, started by next_branch, only depends on the
+        commands before push_branches, and the commands after
+        pop_branches depend on all the sequences."""
+        self.branches.append((self.deps, []))
+
+    def next_branch(self):
+        """Start a new sequence of commands after push_branches."""
+        base, ends = self.branches[-1]
+        ends.extend(self.deps)
+        self.deps = base
+
+    def pop_branches(self):
+        """End the sequences of commands started by push_branches."""
+        base, ends = self.branches.pop()
+        ends.extend(self.deps)
+        self.deps = []
+        for c in ends:
+            if c not in self.deps:
+                self.deps.append(c)
+
+    def mark(self):
+        """Return a mark of the commands added so far, for use with
+        commands_since and truncate."""
+        return (len(self.cmdlist), self.deps)
+
+    def commands_since(self, mark):
+        """Return the commands added after a mark."""
+        return self.cmdlist[mark[0]:]
+
+    def truncate(self, mark):
+        """Remove the commands added after a mark."""
+        del self.cmdlist[mark[0]:]
+        self.deps = mark[1]
+
     def create_use_dir(self, dir):
         """Remove and recreate a directory and use it for subsequent
         commands."""
@@ -1569,17 +1926,20 @@ class CommandList(object):
         self.add_command_dir('mkdir', None, ['mkdir', '-p', dir])
         self.use_dir(dir)
 
-    def add_command_dir(self, desc, dir, command, always_run=False):
-        """Add a command to run in a given directory."""
+    def add_command_dir(self, desc, dir, command, always_run=False,
+                        exclusive=None):
+        """Add a command to run in a given directory, after the previous
+        commands.  EXCLUSIVE, if not None, names a resource used by the
+        command, such as an installation directory, which no command
+        running in parallel may use."""
         cmd = Command(self.desc_txt(desc), len(self.cmdlist), dir, self.path,
-                      command, always_run)
+                      command, always_run, self.deps, exclusive, self.env)
         self.cmdlist.append(cmd)
+        self.deps = [cmd]
 
-    def add_command(self, desc, command, always_run=False):
+    def add_command(self, desc, command, always_run=False, exclusive=None):
         """Add a command to run in the default directory."""
-        cmd = Command(self.desc_txt(desc), len(self.cmdlist), self.dir,
-                      self.path, command, always_run)
-        self.cmdlist.append(cmd)
+        self.add_command_dir(desc, self.dir, command, always_run, exclusive)
 
     def cleanup_dir(self, desc='cleanup', dir=None):
         """Clean up a build directory.  If no directory is specified, the
@@ -1592,46 +1952,239 @@ class CommandList(object):
             self.add_command_dir(desc, None, ['rm', '-rf', dir],
                                  always_run=(self.keep == 'none'))
 
-    def makefile_commands(self, wrapper, logsdir):
-        """Return the sequence of commands in the form of text for a Makefile.
-        The given wrapper script takes arguments: base of logs for
-        previous command, or empty; base of logs for this command;
-        description; directory; PATH addition; the command itself."""
-        # prev_base is the base of the name for logs of the previous
-        # command that is not always-run (that is, a build command,
-        # whose failure should stop subsequent build commands from
-        # being run, as opposed to a cleanup command, which is run
-        # even if previous commands failed).
-        prev_base = ''
-        cmds = []
-        for c in self.cmdlist:
-            ctxt = c.shell_make_quote()
-            if prev_base and not c.always_run:
-                prev_log = os.path.join(logsdir, prev_base)
-            else:
-                prev_log = ''
-            this_log = os.path.join(logsdir, c.logbase)
-            if not c.always_run:
-                prev_base = c.logbase
-            if c.dir is None:
-                dir = ''
-            else:
-                dir = c.dir
-            if c.path is None:
-                path = ''
-            else:
-                path = c.path
-            prelims = [wrapper, prev_log, this_log, c.desc, dir, path]
-            prelim_txt = Command.shell_make_quote_list(prelims, False)
-            cmds.append('\t@%s %s' % (prelim_txt, ctxt))
-        return '\n'.join(cmds)
-
     def status_logs(self, logsdir):
         """Return the list of log files with command status."""
         return [os.path.join(logsdir, '%s-status.txt' % c.logbase)
                 for c in self.cmdlist]
 
 
+class Scheduler(object):
+    """Run the commands of the build in parallel, as allowed by their
+    dependencies.
+
+    The job slots are shared with make through a GNU make jobserver:
+    each command takes a job slot to start, and make commands take
+    further slots from the jobserver for the jobs they run in parallel,
+    as long as any are free.  The ready commands with the longest
+    estimated chain of dependent commands after them, the critical path
+    of the build, are started first.
+
+    The wall time, CPU time and peak resident set size of each command
+    are recorded in the resources dictionary, indexed by the description
+    of the command, and at the end of its log."""
+
+    def __init__(self, parallelism, wrapper, costs=None):
+        """Initialize a Scheduler object.  The given wrapper script takes
+        arguments: base of logs for a previous command that must have
+        passed for this command to run, or empty; base of logs for this
+        command; description; directory; PATH addition; the command
+        itself.  COSTS, if not None, is a dictionary of the times taken by
+        commands, indexed by their description, used instead of the
+        estimates of the commands (see command_costs)."""
+        self.parallelism = parallelism
+        self.wrapper = wrapper
+        self.costs = costs or {}
+        self.resources = {}
+
+    @staticmethod
+    def run_command(args, env, pass_fds):
+        """Run a command, with the file descriptors PASS_FDS left open,
+        and return a tuple of its exit status and a dictionary of the
+        resources it used."""
+        start = time.time()
+        proc = subprocess.Popen(args, env=env, pass_fds=pass_fds)
+        pid, status, rusage = os.wait4(proc.pid, 0)
+        wall_time = time.time() - start
+        if os.WIFSIGNALED(status):
+            proc.returncode = -os.WTERMSIG(status)
+        else:
+            proc.returncode = os.WEXITSTATUS(status)
+        # The usage of the wrapper includes that of the processes it
+        # waited for; ru_maxrss is that of the largest of them, in
+        # kilobytes.
+        resources = {'wall-time': round(wall_time, 2),
+                     'cpu-time': round(rusage.ru_utime + rusage.ru_stime, 2),
+                     'max-rss': rusage.ru_maxrss}
+        return proc.returncode, resources
+
+    @staticmethod
+    def read_token(fd):
+        """Read a jobserver token from FD, waiting until one is available.
+        make may have made the pipe non-blocking, and other processes may
+        take the token first."""
+        while True:
+            select.select([fd], [], [])
+            try:
+                return os.read(fd, 1)
+            except BlockingIOError:
+                pass
+
+    def command_costs(self, commands):
+        """Return a dictionary of the costs of COMMANDS to order them by.
+        Commands without a recorded time get the average of those recorded
+        for the same step of other commands, or else their estimate,
+        scaled to the recorded times so that the two can be compared."""
+        step_times = {}
+        recorded = 0
+        estimated = 0
+        for c in commands:
+            if c.desc in self.costs:
+                step = c.desc.split()[-1]
+                step_times.setdefault(step, []).append(self.costs[c.desc])
+                recorded += self.costs[c.desc]
+                estimated += c.cost()
+        scale = recorded / estimated if recorded else 1
+        costs = {}
+        for c in commands:
+            step = c.desc.split()[-1]
+            if c.desc in self.costs:
+                costs[c] = self.costs[c.desc]
+            elif step in step_times:
+                costs[c] = sum(step_times[step]) / len(step_times[step])
+            else:
+                costs[c] = c.cost() * scale
+        return costs
+
+    @staticmethod
+    def read_status(logbase):
+        """Return the status recorded by the wrapper for a command."""
+        try:
+            with open('%s-status.txt' % logbase, 'r') as f:
+                return f.read().split(':', 1)[0]
+        except FileNotFoundError:
+            return 'FAIL'
+
+    def run(self, cmdlists):
+        """Run the commands of a list of (CommandList, logs directory)
+        pairs."""
+        commands = []
+        logbase = {}
+        for cmdlist, logsdir in cmdlists:
+            for c in cmdlist.cmdlist:
+                commands.append(c)
+                logbase[c] = os.path.join(logsdir, c.logbase)
+        order = {c: n for n, c in enumerate(commands)}
+        users = {c: [] for c in commands}
+        for c in commands:
+            for d in c.deps:
+                users[d].append(c)
+        # Commands only depend on earlier commands of the same list.
+        costs = self.command_costs(commands)
+        priority = {}
+        for c in reversed(commands):
+            priority[c] = costs[c] + max([0] + [priority[u]
+                                                for u in users[c]])
+        waiting = {c: len(c.deps) for c in commands}
+        ready = [(-priority[c], order[c], c) for c in commands if not c.deps]
+        heapq.heapify(ready)
+
+        # The jobserver pipe holds a token for each job slot but the one
+        # that is implicitly the scheduler's.  A command started in a slot
+        # from the pipe returns its token when it finishes.  Tokens are
+        # read in a separate thread, since the read blocks while make
+        # commands hold all of them.
+        token_r, token_w = os.pipe()
+        os.write(token_w, b'+' * (self.parallelism - 1))
+        makeflags = ('-j --jobserver-fds=%d,%d --jobserver-auth=%d,%d'
+                     % (token_r, token_w, token_r, token_w))
+        implicit_free = True
+        token_future = None
+
+        status = {}
+        exclusive = set()
+        running = {}
+        failed = None
+        pool = concurrent.futures.ThreadPoolExecutor(self.parallelism)
+        reader = concurrent.futures.ThreadPoolExecutor(1)
+        with pool, reader:
+            while running or token_future or (ready and failed is None):
+                blocked = []
+                need_slot = False
+                while ready and failed is None:
+                    item = heapq.heappop(ready)
+                    c = item[2]
+                    if c.exclusive is not None and c.exclusive in exclusive:
+                        blocked.append(item)
+                        continue
+                    if implicit_free:
+                        token = None
+                        implicit_free = False
+                    elif token_future is not None and token_future.done():
+                        token = token_future.result()
+                        token_future = None
+                    else:
+                        blocked.append(item)
+                        need_slot = True
+                        if token_future is None and self.parallelism > 1:
+                            token_future = reader.submit(self.read_token, token_r)
+                        break
+                    command = c.command
+                    env = None
+                    if c.env:
+                        env = dict(os.environ, **c.env)
+                    pass_fds = ()
+                    if c.uses_make_jobs():
+                        env = dict(env or os.environ, MAKEFLAGS=makeflags)
+                        pass_fds = (token_r, token_w)
+                    prev_log = ''
+                    if not c.always_run and c.status_deps:
+                        failed_deps = [d for d in c.status_deps
+                                       if status[d] != 'PASS']
+                        prev_log = logbase[(failed_deps or c.status_deps)[0]]
+                    args = [self.wrapper, prev_log, logbase[c], c.desc,
+                            c.dir or '', c.path or ''] + command
+                    future = pool.submit(self.run_command, args, env,
+                                         pass_fds)
+                    running[future] = (c, token)
+                    if c.exclusive is not None:
+                        exclusive.add(c.exclusive)
+                for item in blocked:
+                    heapq.heappush(ready, item)
+                # A token read while no command could be started is
+                # returned.
+                if (token_future is not None and token_future.done()
+                    and not need_slot):
+                    os.write(token_w, token_future.result())
+                    token_future = None
+                waiting_for = list(running)
+                if token_future is not None:
+                    waiting_for.append(token_future)
+                if not waiting_for:
+                    break
+                done, _ = concurrent.futures.wait(
+                    waiting_for,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    if future is token_future:
+                        continue
+                    c, token = running.pop(future)
+                    if token is None:
+                        implicit_free = True
+                    else:
+                        os.write(token_w, token)
+                    exclusive.discard(c.exclusive)
+                    returncode, resources = future.result()
+                    if returncode and failed is None:
+                        failed = (returncode, c)
+                    self.resources[c.desc] = resources
+                    with open('%s-log.txt' % logbase[c], 'a') as f:
+                        f.write('Wall time: %.2f s\nCPU time: %.2f s\n'
+                                'Peak RSS: %d KiB\n'
+                                % (resources['wall-time'],
+                                   resources['cpu-time'],
+                                   resources['max-rss']))
+                    status[c] = self.read_status(logbase[c])
+                    for u in users[c]:
+                        waiting[u] -= 1
+                        if not waiting[u]:
+                            heapq.heappush(ready, (-priority[u], order[u], u))
+        os.close(token_r)
+        os.close(token_w)
+        if failed is not None:
+            raise subprocess.CalledProcessError(failed[0],
+                                                [self.wrapper, failed[1].desc])
+
+
 def get_parser():
     """Return an argument parser for this module."""
     parser = argparse.ArgumentParser(description=__doc__)
@@ -1649,12 +2202,26 @@ def get_parser():
                         help='Strip installed glibc libraries')
     parser.add_argument('--full-gcc', action='store_true',
                         help='Build GCC with all languages and libsanitizer')
+    parser.add_argument('--compilers-cache', type=int, default=0,
+                        help='Cache the parts of the compilers built, '
+                        'restoring those whose sources and configuration '
+                        'are unchanged, in at most this number of '
+                        'megabytes (default: no cache)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Keep the glibc build directories and rebuild '
+                        'them incrementally, configuring them again only '
+                        'when the inputs of configure changed')
+    parser.add_argument('--ccache', type=int, default=0,
+                        help='Compile glibc with ccache, using a cache of at '
+                        'most this number of megabytes for each '
+                        'architecture (default: no ccache)')
     parser.add_argument('topdir',
                         help='Toplevel working directory')
     parser.add_argument('action',
                         help='What to do',
                         choices=('checkout', 'bot-cycle', 'bot',
-                                 'host-libraries', 'compilers', 'glibcs'))
+                                 'host-libraries', 'compilers', 'glibcs',
+                                 'report-resources'))
     parser.add_argument('configs',
                         help='Versions to check out or configurations to build',
                         nargs='*')
@@ -1667,7 +2234,8 @@ def main(argv):
     opts = parser.parse_args(argv)
     topdir = os.path.abspath(opts.topdir)
     ctx = Context(topdir, opts.parallelism, opts.keep, opts.replace_sources,
-                  opts.strip, opts.full_gcc, opts.action)
+                  opts.strip, opts.full_gcc, opts.compilers_cache,
+                  opts.incremental, opts.ccache, opts.action)
     ctx.run_builds(opts.action, opts.configs)
 
 